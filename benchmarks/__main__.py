@@ -0,0 +1,70 @@
+import argparse
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+
+from datetime import datetime, timezone
+
+from benchmarks import chain, codec, network
+from blockchain.verification import signature_verifier
+from p2p.transports import TRANSPORT_ASYNCIO, TRANSPORTS
+
+"""
+Benchmark Suite
+ - Runs the chain, codec and network benchmarks and writes one JSON report, tagged with the git commit, so runs on
+   different commits can be compared
+ - Output printed by the nodes while the benchmarks run goes to stderr, leaving stdout to the report
+ - Run with: python -m benchmarks --blocks 20 --transactions 50 --nodes 4 --output results.json
+"""
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-b', '--blocks', default=20, type=int, help='blocks of transfers in the synthetic chain')
+    parser.add_argument('-n', '--transactions', default=50, type=int, help='transfers per block')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='repetitions of every timed operation')
+    parser.add_argument('-N', '--nodes', default=4, type=int, help='nodes in the network benchmark')
+    parser.add_argument('-t', '--transport', default=TRANSPORT_ASYNCIO, choices=sorted(TRANSPORTS), help='P2P transport of the network benchmark')
+    parser.add_argument('-p', '--port', default=16000, type=int, help='first port used by the network benchmark')
+    parser.add_argument('--skip-network', action='store_true', help='do not run the network benchmark')
+    parser.add_argument('-o', '--output', help='file to write the report to, instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'parameters': vars(args),
+    }
+
+    signature_verifier.start()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report['chain'] = chain.run(args.blocks, args.transactions, args.repeat)
+        report['codec'] = codec.run(args.blocks * args.transactions, args.repeat)
+
+        if not args.skip_network:
+            report['network'] = network.run(args.nodes, args.blocks, args.transactions, args.transport, args.port)
+
+    signature_verifier.shutdown()
+
+    output = json.dumps(report, indent=2)
+
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import json
+import time
+
+from benchmarks.synthetic import TRANSFER_AMOUNT, build_chain
+from benchmarks.timing import measure
+
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+from blockchain.mempool import Mempool
+from blockchain.transaction import Transaction, UnspentTransactionOutSet
+from blockchain.verification import signature_cache
+
+"""
+Chain Benchmark
+ - Times chain validation, chain replacement, UTXO updates, transaction creation, block hashing and JSON round trips
+   on a synthetic chain, reporting average seconds per operation as JSON
+ - Signature verification is timed cold: the signature cache is cleared before every run, unless stated otherwise
+ - Run with: python -m benchmarks.chain --blocks 20 --transactions 50
+"""
+
+def run(block_count: int, transactions_per_block: int, repeat: int) -> dict:
+    start = time.perf_counter()
+    (blockchain, owner, wallets) = build_chain(block_count, transactions_per_block)
+    build_seconds = time.perf_counter() - start
+
+    chain = list(blockchain.chain)
+    chain_data = json.loads(json.dumps([block.to_json() for block in chain]))
+
+    def valid_chain():
+        signature_cache.clear()
+        Blockchain.valid_chain(chain)
+
+    def replace_chain():
+        signature_cache.clear()
+        Blockchain().replace_chain(chain_data)
+
+    def update_unspent_transaction_outs():
+        unspent_transaction_outs = UnspentTransactionOutSet()
+
+        for block in chain:
+            Transaction.update_unspent_transaction_outs(block.transactions, unspent_transaction_outs)
+
+    def create_transaction():
+        wallets[0].create_transaction(wallets[1].address, TRANSFER_AMOUNT, blockchain.unspent_transaction_outs, Mempool())
+
+    def block_hash():
+        for block in chain:
+            block.invalidate()
+            block.hash()
+
+    def json_round_trip():
+        [Block.from_dict(block_data) for block_data in json.loads(json.dumps([block.to_json() for block in chain]))]
+
+    results = {
+        'blocks': len(chain),
+        'transactions': len(blockchain.transaction_log),
+        'json_bytes': len(json.dumps(chain_data)),
+        'build_seconds': build_seconds,
+        'valid_chain_seconds': measure(valid_chain, repeat),
+        'replace_chain_seconds': measure(replace_chain, repeat),
+    }
+
+    # Signatures seen before, as when the same blocks arrive again from another peer
+    Blockchain().replace_chain(chain_data)
+    results['replace_chain_cached_seconds'] = measure(lambda: Blockchain().replace_chain(chain_data), repeat)
+
+    results['update_unspent_transaction_outs_seconds'] = measure(update_unspent_transaction_outs, repeat)
+    results['create_transaction_seconds'] = measure(create_transaction, repeat)
+    results['block_hash_seconds'] = measure(block_hash, repeat) / len(chain)
+    results['json_round_trip_seconds'] = measure(json_round_trip, repeat)
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--blocks', default=20, type=int, help='blocks of transfers in the chain')
+    parser.add_argument('-n', '--transactions', default=50, type=int, help='transfers per block')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='repetitions of every measurement')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.blocks, args.transactions, args.repeat), indent=2))
@@ -0,0 +1,65 @@
+import json
+import os
+
+from benchmarks.timing import measure
+
+from blockchain.block import Block
+from blockchain.codec import decode_block, encode_block
+from blockchain.transaction import Transaction, TransactionIn, TransactionOut
+
+"""
+Codec Benchmark
+ - Compares the binary codec against the JSON path (Block.to_json, json serialization and parsing, Block.from_dict)
+   on synthetic blocks, reporting encoded sizes and encode/decode times as JSON
+ - Run with: python -m benchmarks.codec --transactions 1000 --repeat 20
+"""
+
+def random_hex(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+def synthetic_block(transaction_count: int) -> Block:
+    # Keys and signatures only need the right shape, nothing is validated
+    transactions = []
+
+    for i in range(transaction_count):
+        transaction_ins = [TransactionIn(random_hex(32), i % 4, random_hex(71))]
+        transaction_outs = [TransactionOut(random_hex(64), 2.5), TransactionOut(random_hex(64), 7.25)]
+
+        transactions.append(Transaction(transaction_ins, transaction_outs))
+
+    return Block(1, random_hex(32), 1, 50, random_hex(64), transactions)
+
+
+def run(transaction_count: int, repeat: int) -> dict:
+    block = synthetic_block(transaction_count)
+
+    encoded = encode_block(block)
+    encoded_json = json.dumps(block.to_json()).encode('utf-8')
+
+    assert decode_block(encoded).hash() == block.hash()
+
+    return {
+        'transactions': transaction_count,
+        'binary': {
+            'bytes': len(encoded),
+            'encode_seconds': measure(lambda: encode_block(block), repeat),
+            'decode_seconds': measure(lambda: decode_block(encoded), repeat),
+        },
+        'json': {
+            'bytes': len(encoded_json),
+            'encode_seconds': measure(lambda: json.dumps(block.to_json()).encode('utf-8'), repeat),
+            'decode_seconds': measure(lambda: Block.from_dict(json.loads(encoded_json)), repeat),
+        },
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=1000, type=int, help='transactions per block')
+    parser.add_argument('-r', '--repeat', default=20, type=int, help='repetitions of every measurement')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.transactions, args.repeat), indent=2))
@@ -0,0 +1,162 @@
+import json
+import time
+import typing
+
+from benchmarks.synthetic import add_block, build_chain, create_transfers
+from benchmarks.timing import wait_until
+
+from blockchain.blockchain import Blockchain
+from blockchain.codec import decode_message, is_message
+from blockchain.gossip import Gossip
+from blockchain.sync import ChainSync
+from blockchain.verification import signature_cache
+
+from p2p.events import P2PEvents
+from p2p.transports import TRANSPORT_ASYNCIO, TRANSPORTS
+
+"""
+Network Benchmark
+ - Runs node_count nodes on the loopback interface: the first one holds a synthetic chain and is connected to all
+   the others, which start from the genesis block
+ - Measures how long each peer takes to sync the chain after it is announced, how long a new block takes to reach
+   every peer, and how many transactions per second the transaction relay gets into every peer's mempool
+ - Latencies include the polling interval of wait_until, a few milliseconds at most
+ - All the nodes run in one process and share the signature cache, so only the first peer to verify a signature pays for it
+ - Run with: python -m benchmarks.network --nodes 4 --transport asyncio
+"""
+
+# Seconds to wait for the peers before a measurement is given up on
+TIMEOUT = 60
+
+
+def latency(condition: typing.Callable[[], bool], start: float) -> typing.Union[float, None]:
+    # Seconds from start until condition() holds; the peers are waited on one after the other, all measured from the same start
+    if wait_until(condition, TIMEOUT) is None:
+        return None
+
+    return time.perf_counter() - start
+
+
+class BenchmarkNode():
+    """
+    A P2P node with its own blockchain, handling the same messages as the node in main.py
+    """
+    def __init__(self, blockchain: Blockchain, transport: str, port: int) -> None:
+        self.blockchain = blockchain
+
+        self.node = TRANSPORTS[transport]()
+        self.sync = ChainSync(self.blockchain, self.node, self.handle_chain_updated)
+        self.gossip = Gossip(self.blockchain, self.sync)
+
+        self.node.init('127.0.0.1', port, self.handle_p2p_events)
+
+    def handle_p2p_events(self, event, data, connection = None) -> None:
+        if event != P2PEvents.MESSAGE_RECEIVED:
+            return
+
+        if is_message(data):
+            data = decode_message(data)
+
+        if data['event'] in ChainSync.EVENTS:
+            self.sync.handle_message(data, connection)
+        elif data['event'] in Gossip.EVENTS:
+            self.gossip.handle_message(data, connection)
+
+    def handle_chain_updated(self) -> None:
+        self.gossip.announce_block(self.blockchain.last_block)
+
+    def start(self) -> None:
+        self.node.start()
+        self.gossip.start()
+
+    def stop(self) -> None:
+        self.gossip.stop()
+
+        self.node.stop()
+        self.node.join()
+
+
+def run(node_count: int, block_count: int, transactions_per_block: int, transport: str, base_port: int = 16000) -> dict:
+    (blockchain, owner, wallets) = build_chain(block_count, transactions_per_block)
+
+    source = BenchmarkNode(blockchain, transport, base_port)
+    peers = [BenchmarkNode(Blockchain(), transport, base_port + i) for i in range(1, node_count)]
+
+    nodes = [source] + peers
+
+    for node in nodes:
+        node.start()
+
+    try:
+        for peer in peers:
+            source.node.connect('127.0.0.1', peer.node.port)
+
+        if wait_until(lambda: len(source.node.connections) == len(peers), TIMEOUT) is None:
+            raise RuntimeError('Peers did not connect')
+
+        def synced_with(peer: BenchmarkNode, block_hash: str) -> typing.Callable[[], bool]:
+            # Like every reader of the chain, the tip is read under the read lock, so blocks still being verified are not seen
+            def synced() -> bool:
+                with peer.blockchain.lock.read():
+                    return peer.blockchain.last_block.hash() == block_hash
+
+            return synced
+
+        # Initial sync: the peers only have the genesis block, so the announcement makes them fetch the whole chain
+        last_hash = blockchain.last_block.hash()
+        signature_cache.clear()
+
+        start = time.perf_counter()
+        source.gossip.announce_block(blockchain.last_block)
+
+        sync_seconds = [latency(synced_with(peer, last_hash), start) for peer in peers]
+
+        # A single new block, which the peers fetch and apply as soon as it is announced
+        block = add_block(blockchain, owner, create_transfers(blockchain, wallets))
+        start = time.perf_counter()
+        source.gossip.announce_block(block)
+
+        block_seconds = [latency(synced_with(peer, block.hash()), start) for peer in peers]
+
+        # Transactions are announced in batches, and are done once every peer's mempool has all of them
+        transactions = create_transfers(blockchain, wallets)
+
+        for transaction in transactions:
+            blockchain.add_transaction(transaction)
+
+        start = time.perf_counter()
+
+        for transaction in transactions:
+            source.gossip.add_transaction(transaction)
+
+        ids = [transaction.id for transaction in transactions]
+        relay_seconds = latency(lambda: all(all(id in peer.blockchain.transaction_pool for id in ids) for peer in peers), start)
+
+    finally:
+        for node in nodes:
+            node.stop()
+
+    return {
+        'transport': transport,
+        'nodes': node_count,
+        'blocks': len(blockchain.chain),
+        'sync_seconds': sync_seconds,
+        'block_propagation_seconds': block_seconds,
+        'relayed_transactions': len(transactions),
+        'relay_seconds': relay_seconds,
+        'relay_transactions_per_second': len(transactions) / relay_seconds if relay_seconds else None,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-N', '--nodes', default=4, type=int, help='nodes in the network, including the one holding the chain')
+    parser.add_argument('-b', '--blocks', default=20, type=int, help='blocks of transfers in the chain')
+    parser.add_argument('-n', '--transactions', default=50, type=int, help='transfers per block')
+    parser.add_argument('-t', '--transport', default=TRANSPORT_ASYNCIO, choices=sorted(TRANSPORTS), help='P2P transport of the nodes')
+    parser.add_argument('-p', '--port', default=16000, type=int, help='port of the first node, the others use the following ports')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.nodes, args.blocks, args.transactions, args.transport, args.port), indent=2))
@@ -0,0 +1,76 @@
+import os
+import typing
+
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+from blockchain.transaction import Transaction
+
+from wallet.wallet import Wallet
+
+"""
+Synthetic Chains
+ - Chains of blocks full of real, signed transfers between freshly generated wallets
+ - The owner wallet of the genesis block funds every wallet with SEED_AMOUNT in one batch transaction, then each block
+   has every wallet send TRANSFER_AMOUNT to the next one
+ - Both amounts are powers of two, so the float amounts add up exactly and every transaction validates
+ - Blocks are added directly instead of being minted, so building a chain does not wait for stake slots
+"""
+
+OWNER_KEY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'wallet', 'wallet.key')
+
+SEED_AMOUNT = 0.25
+TRANSFER_AMOUNT = 2 ** -10
+
+# The owner starts with 50 coins and keeps some change
+MAX_TRANSACTIONS_PER_BLOCK = 199
+
+
+def load_owner() -> Wallet:
+    owner = Wallet()
+    owner.load_keys_from_file(OWNER_KEY_FILE)
+
+    return owner
+
+
+def add_block(blockchain: Blockchain, wallet: Wallet, transactions: typing.List[Transaction]) -> Block:
+    index = blockchain.last_block.index + 1
+    coinbase_transaction = Transaction.generation_coinbase_transaction(wallet.address, index)
+
+    block = Block(index, blockchain.last_block.hash(), blockchain.get_difficulty(), wallet.get_account_balance(blockchain.unspent_transaction_outs), wallet.address, [coinbase_transaction] + transactions)
+
+    if not blockchain.add_block(block):
+        raise RuntimeError('Synthetic block ' + str(index) + ' is invalid')
+
+    return block
+
+
+def create_transfers(blockchain: Blockchain, wallets: typing.List[Wallet]) -> typing.List[Transaction]:
+    # One transfer per wallet, to the next wallet
+    transactions = []
+
+    for i, wallet in enumerate(wallets):
+        recipient = wallets[(i + 1) % len(wallets)].address
+        transactions.append(wallet.create_transaction(recipient, TRANSFER_AMOUNT, blockchain.unspent_transaction_outs, blockchain.transaction_pool))
+
+    return transactions
+
+
+def build_chain(block_count: int, transactions_per_block: int) -> typing.Tuple[Blockchain, Wallet, typing.List[Wallet]]:
+    """
+    Blockchain with a funding block followed by block_count blocks of transactions_per_block transfers each
+    """
+    if not 1 <= transactions_per_block <= MAX_TRANSACTIONS_PER_BLOCK:
+        raise ValueError('transactions_per_block must be between 1 and ' + str(MAX_TRANSACTIONS_PER_BLOCK))
+
+    owner = load_owner()
+    wallets = [Wallet() for _ in range(transactions_per_block)]
+
+    blockchain = Blockchain()
+
+    seed_transaction = owner.create_batch_transaction([(wallet.address, SEED_AMOUNT) for wallet in wallets], blockchain.unspent_transaction_outs, blockchain.transaction_pool)
+    add_block(blockchain, owner, [seed_transaction])
+
+    for _ in range(block_count):
+        add_block(blockchain, owner, create_transfers(blockchain, wallets))
+
+    return blockchain, owner, wallets
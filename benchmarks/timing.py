@@ -0,0 +1,24 @@
+import time
+import typing
+
+def measure(function: typing.Callable[[], typing.Any], repeat: int) -> float:
+    # Average wall clock seconds of one call
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        function()
+
+    return (time.perf_counter() - start) / repeat
+
+
+def wait_until(condition: typing.Callable[[], bool], timeout: float, interval: float = 0.002) -> typing.Union[float, None]:
+    # Seconds until condition() holds, or None if it did not within timeout
+    start = time.perf_counter()
+
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            return None
+
+        time.sleep(interval)
+
+    return time.perf_counter() - start
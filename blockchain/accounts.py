@@ -0,0 +1,77 @@
+import typing
+
+from blockchain.constants import CHAIN_ADDRESS
+from blockchain.transaction import Transaction, TransactionTypes, UnspentTransactionOutSet
+
+class AccountIndex():
+    """
+    Account Index
+     - Total stake and validator status of every address, maintained as blocks are applied and rolled back
+     - The owner of a STAKE or VALIDATOR transaction is the address of the transaction out spent by its first transaction in,
+       which validation has already tied to the signature
+     - Genesis transactions do not spend anything and belong to the minter of the genesis block
+     - Validation rejects transactions without transaction ins, but the index does not rely on it and skips them
+    """
+    def __init__(self) -> None:
+        self.stakes: typing.Dict[str, float] = {}
+        self.validators: typing.Dict[str, int] = {}
+
+    def get_stake(self, address: str) -> float:
+        return self.stakes.get(address, 0)
+
+    def is_validator(self, address: str) -> bool:
+        return self.validators.get(address, 0) > 0
+
+    def apply_transactions(self, transactions: typing.List[Transaction], unspent_transaction_outs: UnspentTransactionOutSet, minter_address: str) -> typing.List[typing.Tuple[str, float, int]]:
+        """
+        Must be called before the transactions are applied to the UTXO set, as the spent transaction outs identify the owners
+        :return: The (address, stake, validator) changes, used to revert the block
+        """
+        changes: typing.List[typing.Tuple[str, float, int]] = []
+
+        for transaction in transactions:
+            if transaction.type != TransactionTypes.STAKE and transaction.type != TransactionTypes.VALIDATOR:
+                continue
+
+            if len(transaction.transaction_ins) == 0:
+                continue
+
+            transaction_in = transaction.transaction_ins[0]
+            referenced_unspent_transaction_out = unspent_transaction_outs.find(transaction_in.transaction_out_id, transaction_in.transaction_out_index)
+            address = referenced_unspent_transaction_out.address if referenced_unspent_transaction_out is not None else minter_address
+
+            if transaction.type == TransactionTypes.STAKE:
+                stake = sum([transaction_out.amount for transaction_out in transaction.transaction_outs if transaction_out.address == CHAIN_ADDRESS])
+                changes.append((address, stake, 0))
+            else:
+                changes.append((address, 0, 1))
+
+        for (address, stake, validator) in changes:
+            self.update(address, stake, validator)
+
+        return changes
+
+    def revert(self, changes: typing.List[typing.Tuple[str, float, int]]) -> None:
+        for (address, stake, validator) in reversed(changes):
+            self.update(address, -stake, -validator)
+
+    def update(self, address: str, stake: float, validator: int) -> None:
+        if stake != 0:
+            self.stakes[address] = self.stakes.get(address, 0) + stake
+
+        if validator != 0:
+            self.validators[address] = self.validators.get(address, 0) + validator
+
+    def to_dict(self) -> dict:
+        return {
+            'stakes': self.stakes,
+            'validators': self.validators
+        }
+
+    @staticmethod
+    def from_dict(accounts_data: dict):
+        accounts = AccountIndex()
+        accounts.stakes = dict(accounts_data['stakes'])
+        accounts.validators = dict(accounts_data['validators'])
+
+        return accounts
@@ -1,13 +1,21 @@
 import hashlib
-import json
 import typing
 
 from time import time
 
 from blockchain.constants import GENESIS_BLOCK_INDEX, OWNER_ADDRESS, OWNER_INIT_AMOUNT, CHAIN_ADDRESS, OWNER_INIT_STAKE, VALIDATOR_AMOUNT
+from blockchain.encoding import encode_count, encode_float, encode_int, encode_string
 from blockchain.transaction import Transaction, TransactionIn, TransactionOut, TransactionTypes
 
-class Block(dict):
+class Block():
+    """
+    Block
+     - Plain slotted object; to_json gives the dict that the HTTP API and JSON P2P messages send
+    """
+    FIELDS = ('index', 'timestamp', 'previous_hash', 'difficulty', 'minter_balance', 'minter_address', 'transactions')
+
+    __slots__ = FIELDS + ('cached_hash',)
+
     def __init__(self, index: int, previous_hash: str, difficulty: int, minter_balance: float, minter_address: str, transactions: typing.List[Transaction] = []) -> None:
         self.index = index
 
@@ -21,10 +29,63 @@ class Block(dict):
 
         self.transactions = transactions
 
-        dict.__init__(self, index=self.index, timestamp=self.timestamp, previous_hash=self.previous_hash, difficulty=self.difficulty, minter_balance=self.minter_balance, minter_address=self.minter_address, transactions=self.transactions)
+    def __setattr__(self, name, value):
+        super(Block, self).__setattr__(name, value)
+
+        # Reassigning a field invalidates the cached hash
+        if name in Block.FIELDS:
+            super(Block, self).__setattr__('cached_hash', None)
+
+    def invalidate(self) -> None:
+        # Must be called after changing the transactions list in place
+        super(Block, self).__setattr__('cached_hash', None)
+
+    def encode(self) -> bytes:
+        """
+        Canonical byte encoding of the block, which its hash is computed from
+        """
+        return b''.join([
+            encode_int(self.index),
+            encode_float(self.timestamp),
+            encode_string(self.previous_hash),
+            encode_int(self.difficulty),
+            encode_float(self.minter_balance),
+            encode_string(self.minter_address),
+            encode_count(len(self.transactions)),
+            *[transaction.encode() for transaction in self.transactions],
+        ])
 
     def hash(self):
-        return hashlib.sha256(json.dumps(self, sort_keys=True).encode()).hexdigest()
+        if self.cached_hash is None:
+            super(Block, self).__setattr__('cached_hash', hashlib.sha256(self.encode()).hexdigest())
+
+        return self.cached_hash
+
+    def to_json(self) -> dict:
+        return {
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'previous_hash': self.previous_hash,
+            'difficulty': self.difficulty,
+            'minter_balance': self.minter_balance,
+            'minter_address': self.minter_address,
+            'transactions': [transaction.to_json() for transaction in self.transactions]
+        }
+
+    def header(self) -> dict:
+        """
+        The block without its transactions, used to announce it and to sync chains
+        """
+        return {
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'previous_hash': self.previous_hash,
+            'difficulty': self.difficulty,
+            'minter_balance': self.minter_balance,
+            'minter_address': self.minter_address,
+            'hash': self.hash(),
+            'transaction_count': len(self.transactions)
+        }
 
     @staticmethod
     def genesis():
@@ -38,14 +99,18 @@ class Block(dict):
 
         return Block(GENESIS_BLOCK_INDEX, '', 0, 0, OWNER_ADDRESS, [owner_amount_transaction, owner_validator_transaction, owner_stake_transaction])
 
+    @staticmethod
+    def from_data(block_data) -> 'Block':
+        # Blocks received from peers are already decoded when they come in the binary codec, and plain dicts when they come as JSON
+        if isinstance(block_data, Block):
+            return block_data
+
+        return Block.from_dict(block_data)
+
     @staticmethod
     def from_dict(block_data: dict):
         block = Block(block_data['index'], block_data['previous_hash'], block_data['difficulty'], block_data['minter_balance'], block_data['minter_address'])
         block.timestamp = block_data['timestamp']
-        block.transactions = []
+        block.transactions = [Transaction.from_dict(transaction_data) for transaction_data in block_data['transactions']]
 
-        for transaction_data in block_data['transactions']:
-            block.transactions = block.transactions + [Transaction.from_dict(transaction_data)]
-            block['transactions'] = block.transactions
-        
         return block
\ No newline at end of file
@@ -1,13 +1,20 @@
 import hashlib
 import typing
 import time
-import json
+import threading
 
 from functools import reduce
 
+from blockchain.accounts import AccountIndex
 from blockchain.block import Block
-from blockchain.transaction import Transaction, UnspentTransactionOut
-from blockchain.constants import BLOCK_GENERATION_INTERVAL, DIFFICULTY_ADJUSTMENT_ITNERVAL
+from blockchain.events import event_stream
+from blockchain.locking import ReadWriteLock, reads, writes
+from blockchain.mempool import Mempool
+from blockchain.store import BlockStore
+from blockchain.transaction import Transaction, UnspentTransactionOutSet, UnspentTransactionOutUndo
+from blockchain.transaction_log import TransactionLog
+from blockchain.verification import SignatureJob, signature_verifier
+from blockchain.constants import BLOCK_GENERATION_INTERVAL, DIFFICULTY_ADJUSTMENT_ITNERVAL, GENESIS_BLOCK_INDEX, MAX_BLOCKS_PER_MESSAGE, MAX_HEADERS_PER_MESSAGE, SNAPSHOT_INTERVAL, STAKE_TIMESTAMP_INTERVAL
 
 from wallet.wallet import Wallet
 
@@ -15,86 +22,114 @@ class Blockchain:
     def __init__(self):
         """
         Once our blockchain is instantiated
-         - Transactions List is created which is used to store all the transactions before adding the block to the chain
+         - Transaction Pool (mempool) is created which is used to store all the transactions before adding the block to the chain
          - Chain is empty list which is used to store all the blocks after mining
          - Set is empty set which is made such that there won't be any duplicate node entries to the network
          - Genesis Block is created which acts the first block in the chain with previous_hash = 1 and proof = 100
+         - Changes to the chain, the UTXO set and the account index are made under the write lock of lock, so that readers
+           holding its read lock see them applied atomically. Blocks received from peers are appended before their signatures
+           are verified, so every reader of the chain holds the read lock, and never sees a block that is rolled back again
+         - The transaction pool is guarded by a lock of its own, not by lock. Transactions are added to it holding the read lock,
+           which only keeps the UTXO set they are validated against from changing, so concurrent additions do not wait for each
+           other; transactions leave it under the write lock, along with the blocks that include them
         """
-        self.transaction_pool: typing.List[Transaction] = []
-        self.chain: typing.List[Block] = [Block.genesis()]
+        self.lock = ReadWriteLock()
 
-        unspent_transaction_outs = Transaction.process_transactions(self.chain[0].transactions, [], self.chain[0].index)
+        self.transaction_pool = Mempool()
+        self.chain: typing.List[Block] = []
 
-        if unspent_transaction_outs is not None:
-            self.unspent_transaction_outs: typing.List[UnspentTransactionOut] = unspent_transaction_outs
-        else:
-            self.unspent_transaction_outs: typing.List[UnspentTransactionOut] = []
+        # Height (position in the chain) of every block by its hash
+        self.block_heights: typing.Dict[str, int] = {}
+
+        # Undo records of the UTXO set and the account index, one per block in the chain
+        self.undo_records: typing.List[typing.Tuple[UnspentTransactionOutUndo, list]] = []
+        self.unspent_transaction_outs = UnspentTransactionOutSet()
+        self.accounts = AccountIndex()
+        self.transaction_log = TransactionLog()
 
-        self.block_mining = False
+        # Optional on-disk store the chain is persisted to, see load
+        self.store: typing.Union[BlockStore, None] = None
 
-    def create_new_block(self, wallet: Wallet):
+        self.add_block(Block.genesis())
+
+    def create_new_block(self, wallet: Wallet, cancel_event: typing.Union[threading.Event, None] = None):
         """
          - A coinbase transaction is created for the block, where the sender address is '', and the amount transferred is COINBASE_TRANSACTION
          - A new block is created, where transactions = Coinbase Transaction + Transaction Pool
          - After the Block is created, transactions are processed
-         - Once the transactions are processed, transaction pool is reset back to []
+         - Once the block is added, its transactions are removed from the transaction pool
          - The last Block of chain is returned from this function
+         - None is returned if cancel_event is set before the block is found
         """
 
-        coinbase_transaction = Transaction.generation_coinbase_transaction(wallet.public_key.toString(), self.last_block.index + 1)
+        coinbase_transaction = Transaction.generation_coinbase_transaction(wallet.address, self.last_block.index + 1)
 
-        new_block = self.create_new_block_raw(wallet, [coinbase_transaction] + self.transaction_pool)
+        new_block = self.create_new_block_raw(wallet, [coinbase_transaction] + self.transaction_pool.get_transactions(), cancel_event)
         if new_block is not None:
-            unpspent_transaction_outs = Transaction.process_transactions(new_block.transactions, self.unspent_transaction_outs, new_block.index)
-
-            if unpspent_transaction_outs is not None:
-                self.unspent_transaction_outs = unpspent_transaction_outs
-
-            # Unverified Transactions list is reset back after mining
-            self.transaction_pool = []
             return self.last_block
         else:
             return None
 
-    def create_new_block_raw(self, wallet: Wallet, transactions: typing.List[Transaction]) -> typing.Union[Block, None]:
-        difficulty = self.get_difficulty()
-        new_block = self.find_block(self.last_block.index + 1, self.last_block.hash(), transactions, difficulty, wallet)
+    def create_new_block_raw(self, wallet: Wallet, transactions: typing.List[Transaction], cancel_event: typing.Union[threading.Event, None] = None) -> typing.Union[Block, None]:
+        with self.lock.read():
+            difficulty = self.get_difficulty()
+            (index, previous_hash) = (self.last_block.index + 1, self.last_block.hash())
 
-        if new_block is not None:
-            self.chain.append(new_block)
+        new_block = self.find_block(index, previous_hash, transactions, difficulty, wallet, cancel_event if cancel_event is not None else threading.Event())
+
+        if new_block is not None and self.add_block(new_block):
+            return new_block
 
-        return new_block
+        return None
+
+    def find_block(self, index: int, previous_hash: str, transactions: typing.List[Transaction], difficulty: int, wallet: Wallet, cancel_event: threading.Event) -> typing.Union[Block, None]:
+        """
+        Find a timestamp slot in which the wallet's stake satisfies validate_stake
+         - Stake and balance are read once per attempt
+         - Each slot is checked once, and the attempt sleeps until the next slot starts instead of spinning
+         - Setting cancel_event, for example when a competing block arrives, wakes the attempt and abandons it
+        """
+        address = wallet.address
+
+        with self.lock.read():
+            stake = wallet.get_account_stake(self.accounts)
+            balance = wallet.get_account_balance(self.unspent_transaction_outs)
 
-    def find_block(self, index: int, previous_hash: str, transactions: typing.List[Transaction], difficulty: int, wallet: Wallet) -> typing.Union[Block, None]:
         past_timestamp = 0
 
-        while not self.block_mining:
+        while not cancel_event.is_set():
             current_timestamp = self.get_usable_timestamp()
+
             if not current_timestamp == past_timestamp:
-                if self.validate_stake(previous_hash, wallet.public_key.toString(), current_timestamp, wallet.get_account_stake(self.all_transactions), difficulty):
-                    return Block(index, previous_hash, difficulty, wallet.get_account_balance(self.unspent_transaction_outs), wallet.public_key.toString(), transactions)
+                if self.validate_stake(previous_hash, address, current_timestamp, stake, difficulty):
+                    return Block(index, previous_hash, difficulty, balance, address, transactions)
                 past_timestamp = current_timestamp
 
+            cancel_event.wait(max(0, self.get_slot_start(current_timestamp + 1) - time.time()))
+
         return None
 
     def get_usable_timestamp(self) -> int:
-        return round(time.time() / 1000)
+        return round(time.time() / STAKE_TIMESTAMP_INTERVAL)
+
+    @staticmethod
+    def get_slot_start(timestamp: int) -> float:
+        # get_usable_timestamp rounds, so a slot starts half an interval before its timestamp
+        return (timestamp - 0.5) * STAKE_TIMESTAMP_INTERVAL
 
 
     @staticmethod
-    def valid_chain(chain: typing.List[Block]) -> typing.Union[typing.List[UnspentTransactionOut], None]:
+    def valid_chain(chain: typing.List[Block]) -> typing.Union[UnspentTransactionOutSet, None]:
         """
         Determine if a given blockchain as input is valid
         :param chain: given blockchain
-        :return: True if valid, False if not
+        :return: The resulting UTXO set if valid, None if not
         """
 
-        unspent_transaction_outs = None
+        unspent_transaction_outs = UnspentTransactionOutSet()
 
-        for block in chain:            
-            unspent_transaction_outs = Transaction.process_transactions(block.transactions,  unspent_transaction_outs if unspent_transaction_outs is not None else [], block.index)
-
-            if unspent_transaction_outs is None:
+        for block in chain:
+            if Transaction.process_transactions(block.transactions, unspent_transaction_outs, block.index) is None:
                 return None
 
         return unspent_transaction_outs
@@ -103,36 +138,280 @@ class Blockchain:
     def get_accumulated_difficulty(chain: typing.List[Block]) -> int:
         return reduce(lambda a,b: a + 2 ** b.difficulty, chain, 0)
 
+    @staticmethod
+    def get_accumulated_header_difficulty(headers: typing.List[dict]) -> int:
+        return reduce(lambda a,b: a + 2 ** b['difficulty'], headers, 0)
+
     # This function returns the Last Block in the chain
     @property
     def last_block(self) -> Block:
         return self.chain[-1]
 
+    @writes
+    def add_block(self, block: Block, validate: bool = True, signature_jobs: typing.Union[typing.List[SignatureJob], None] = None, publish: bool = True) -> bool:
+        """
+        Validate a block against the tip of the chain and apply it
+         - The block has to extend the last block of the chain
+         - Its transactions are validated against the UTXO set
+         - If signature_jobs is given, signatures are collected into it rather than verified, and the caller has to verify them
+         - The UTXO set and account index are updated, and an undo record is kept to roll the block back later
+         - Unless publish is False, the block is written to the store and published as a block event, and its transactions
+           leave the pool; otherwise the caller has to call publish_blocks once the block is known to stay
+        """
+        if len(self.chain) > 0 and (block.index != self.last_block.index + 1 or block.previous_hash != self.last_block.hash()):
+            return False
+
+        if validate and not block.index == GENESIS_BLOCK_INDEX and not Transaction.validate_transactions_in_block(block.transactions, self.unspent_transaction_outs, block.index, signature_jobs):
+            return False
+
+        account_changes = self.accounts.apply_transactions(block.transactions, self.unspent_transaction_outs, block.minter_address)
+        unspent_transaction_out_undo = self.unspent_transaction_outs.apply_transactions(block.transactions)
+
+        self.undo_records.append((unspent_transaction_out_undo, account_changes))
+        self.transaction_log.append_block(block)
+        self.block_heights[block.hash()] = len(self.chain)
+        self.chain.append(block)
+
+        if publish:
+            self.publish_blocks(len(self.chain) - 1)
+
+        return True
+
+    @writes
+    def publish_blocks(self, height: int) -> None:
+        """
+        Write the blocks from the given height to the tip to the store, publish them as block events, and remove the
+        transactions they include from the pool
+         - A snapshot is taken at the tip if the blocks pass a multiple of SNAPSHOT_INTERVAL
+        """
+        for block_height in range(height, len(self.chain)):
+            block = self.chain[block_height]
+
+            self.transaction_pool.remove_included(block.transactions)
+
+            if event_stream.active:
+                event_stream.publish('block', block.header())
+
+            if self.store is not None:
+                (unspent_transaction_out_undo, account_changes) = self.undo_records[block_height]
+                self.store.append_block(block_height, block.hash(), block, {'unspent_transaction_outs': unspent_transaction_out_undo.to_dict(), 'accounts': account_changes})
+
+        if self.store is not None and len(self.chain) // SNAPSHOT_INTERVAL > height // SNAPSHOT_INTERVAL:
+            self.store.save_snapshot(len(self.chain), self.unspent_transaction_outs.serialize(), self.accounts.to_dict())
+
+    @writes
+    def publish_removed_blocks(self, height: int, blocks: typing.List[Block]) -> None:
+        """
+        Delete the blocks from the given height on from the store, and publish the rolled back blocks, given from the tip down,
+        as block_removed events
+        """
+        if event_stream.active:
+            for block in blocks:
+                event_stream.publish('block_removed', block.header())
+
+        if self.store is not None:
+            self.store.truncate(height)
+
+    @writes
+    def remove_last_block(self, publish: bool = True) -> Block:
+        (unspent_transaction_out_undo, account_changes) = self.undo_records.pop()
+
+        self.unspent_transaction_outs.revert(unspent_transaction_out_undo)
+        self.accounts.revert(account_changes)
+        self.transaction_log.remove_last_block()
+
+        block = self.chain.pop()
+        del self.block_heights[block.hash()]
+
+        if publish:
+            self.publish_removed_blocks(len(self.chain), [block])
+
+        return block
+
+    @writes
+    def load(self, store: BlockStore) -> None:
+        """
+        Attach an on-disk block store to the chain
+         - If the store is empty, the current chain is written to it
+         - Otherwise the chain is restored from it: blocks up to the latest snapshot are loaded with their undo records as they are,
+           the UTXO set and account index come from the snapshot, and only the blocks after it are validated and applied again
+        """
+        self.store = None
+
+        if store.get_height() == 0:
+            for (height, block) in enumerate(self.chain):
+                (unspent_transaction_out_undo, account_changes) = self.undo_records[height]
+                store.append_block(height, block.hash(), block, {'unspent_transaction_outs': unspent_transaction_out_undo.to_dict(), 'accounts': account_changes})
+
+            self.store = store
+            return
+
+        self.chain = []
+        self.block_heights = {}
+        self.undo_records = []
+        self.unspent_transaction_outs = UnspentTransactionOutSet()
+        self.accounts = AccountIndex()
+        self.transaction_log = TransactionLog()
+
+        snapshot = store.load_snapshot()
+        snapshot_height = snapshot[0] if snapshot is not None else 0
+
+        remaining_blocks: typing.List[Block] = []
+
+        for (height, (block, undo_data)) in enumerate(store.load_blocks()):
+            if height < snapshot_height:
+                self.undo_records.append((UnspentTransactionOutUndo.from_dict(undo_data['unspent_transaction_outs']), [tuple(change) for change in undo_data['accounts']]))
+                self.transaction_log.append_block(block)
+                self.block_heights[block.hash()] = len(self.chain)
+                self.chain.append(block)
+            else:
+                remaining_blocks.append(block)
+
+        if snapshot is not None:
+            (_, unspent_transaction_outs_data, accounts_data) = snapshot
+
+            self.unspent_transaction_outs = UnspentTransactionOutSet.from_list(unspent_transaction_outs_data)
+            self.accounts = AccountIndex.from_dict(accounts_data)
+
+        # The blocks after the snapshot are written back as they are validated again
+        store.truncate(len(self.chain))
+        self.store = store
+
+        for block in remaining_blocks:
+            if not self.add_block(block):
+                break
+
+    def find_common_length(self, chain: typing.List[Block]) -> int:
+        """
+        Number of leading blocks the given chain shares with the local chain
+         - The hash of a received block is read from the previous_hash of its successor, so only the received tip is hashed
+        """
+        for i in range(min(len(self.chain), len(chain)) - 1, -1, -1):
+            if i + 1 < len(chain):
+                block_hash = chain[i + 1].previous_hash
+            else:
+                block_hash = chain[i].hash()
+
+            if block_hash == self.chain[i].hash():
+                return i + 1
+
+        return 0
+
+    @writes
     def replace_chain(self, chain_data: typing.List[dict]) -> bool:
-        new_chain: typing.List[Block] = []
+        """
+        Switch to the given chain if it has at least the accumulated difficulty of the local one
+        """
+        chain = [Block.from_data(block_data) for block_data in chain_data]
+        common_length = self.find_common_length(chain)
+
+        if common_length == len(chain) == len(self.chain):
+            return False
+
+        return self.switch_chain(common_length, chain[common_length:])
+
+    @writes
+    def apply_blocks(self, blocks_data: typing.List[dict]) -> bool:
+        """
+        Apply a run of consecutive blocks received from a peer
+         - Leading blocks the local chain already has are skipped
+         - The first new block has to extend a block of the local chain, or be a genesis block
+        """
+        blocks = [Block.from_data(block_data) for block_data in blocks_data]
+
+        known = 0
+        while known + 1 < len(blocks) and blocks[known + 1].previous_hash in self.block_heights:
+            known += 1
+
+        if known == len(blocks) - 1 and blocks[-1].hash() in self.block_heights:
+            return False
+
+        blocks = blocks[known:]
+
+        if blocks[0].previous_hash in self.block_heights:
+            common_length = self.block_heights[blocks[0].previous_hash] + 1
+        elif blocks[0].index == GENESIS_BLOCK_INDEX:
+            common_length = 0
+        else:
+            return False
+
+        return self.switch_chain(common_length, blocks)
+
+    @writes
+    def switch_chain(self, common_length: int, blocks: typing.List[Block]) -> bool:
+        """
+        Replace the blocks after the first common_length blocks with the given ones, if they have at least the same accumulated difficulty
+         - Only the blocks after the common ancestor are rolled back, validated and applied
+         - Signatures of all the new blocks are verified together once they are applied
+         - If any of the new blocks is invalid, or applying them raises, the local chain is restored
+         - The switch is only written to the store and published once the new blocks are verified, so a rejected chain is never
+           persisted or seen by the event stream, and the pool keeps the transactions it included
+        """
+        if Blockchain.get_accumulated_difficulty(blocks) < Blockchain.get_accumulated_difficulty(self.chain[common_length:]):
+            return False
+
+        removed_blocks: typing.List[Block] = []
+        while len(self.chain) > common_length:
+            removed_blocks.append(self.remove_last_block(publish=False))
+
+        signature_jobs: typing.List[SignatureJob] = []
+        valid = True
+
+        try:
+            for block in blocks:
+                if not self.add_block(block, signature_jobs=signature_jobs, publish=False):
+                    valid = False
+                    break
+
+            valid = valid and signature_verifier.verify(signature_jobs)
+
+        except Exception:
+            self.restore_chain(common_length, removed_blocks)
+            raise
 
-        for block_data in chain_data:
-            new_chain.append(Block.from_dict(block_data))
+        if not valid:
+            self.restore_chain(common_length, removed_blocks)
+            return False
 
-        unspent_transaction_outs = Blockchain.valid_chain(new_chain)
+        self.publish_removed_blocks(common_length, removed_blocks)
+        self.publish_blocks(common_length)
 
-        if unspent_transaction_outs is not None and Blockchain.get_accumulated_difficulty(new_chain) >= Blockchain.get_accumulated_difficulty(self.chain):
-            self.chain = new_chain
+        # Pooled transactions may spend transaction outs the new blocks spent, and the rolled back blocks may have had
+        # transactions the new ones do not include
+        self.transaction_pool.prune(self.unspent_transaction_outs)
 
-            self.chain[0].timestamp = new_chain[0].timestamp
-            self.chain[0]['timestamp'] = self.chain[0].timestamp
+        for block in reversed(removed_blocks):
+            for transaction in block.transactions:
+                self.transaction_pool.add(transaction, self.unspent_transaction_outs)
 
-            self.unspent_transaction_outs = unspent_transaction_outs
-            return True
-        
-        return False
+        return True
+
+    @writes
+    def restore_chain(self, common_length: int, removed_blocks: typing.List[Block]) -> None:
+        """
+        Undo a switch that was not published: roll back to the first common_length blocks, and add the rolled back blocks,
+        given from the tip down, again
+        """
+        while len(self.chain) > common_length:
+            self.remove_last_block(publish=False)
+
+        for block in reversed(removed_blocks):
+            self.add_block(block, validate=False, publish=False)
 
 
+    @reads
+    def add_transaction(self, transaction: Transaction) -> bool:
+        # Validated against the UTXO set as of one block, not halfway through applying one; the pool itself is changed under
+        # its own lock, see __init__
+        return self.transaction_pool.add(transaction, self.unspent_transaction_outs)
+
+    @reads
     def replace_pool(self, new_pool: typing.List[dict]):
-        self.transaction_pool = []
+        # Like add_transaction, the read lock only keeps the UTXO set from changing while the new pool is validated
+        self.transaction_pool.clear()
 
         for transaction in new_pool:
-            self.transaction_pool.append(Transaction.from_dict(transaction))
+            self.transaction_pool.add(Transaction.from_dict(transaction), self.unspent_transaction_outs)
 
 
     def get_difficulty(self) -> int:
@@ -164,5 +443,65 @@ class Blockchain:
         return balance_over_diff - staking_hash >= 0
 
     @property
-    def all_transactions(self) -> typing.List[Transaction]:
-        return reduce(lambda a, b: a + b, [block.transactions for block in self.chain], [])
\ No newline at end of file
+    def all_transactions(self) -> TransactionLog:
+        return self.transaction_log
+
+    @reads
+    def find_transaction(self, transaction_id: str) -> typing.Union[Transaction, None]:
+        return self.transaction_log.find(transaction_id)
+
+    @reads
+    def get_block(self, block_hash: str) -> typing.Union[Block, None]:
+        height = self.block_heights.get(block_hash)
+
+        if height is None:
+            return None
+
+        return self.chain[height]
+
+    @reads
+    def get_transactions(self, start: int, limit: int) -> typing.List[Transaction]:
+        return self.transaction_log.transactions[start:start + limit]
+
+    @reads
+    def get_locator(self) -> typing.List[str]:
+        """
+        Hashes of the last ten blocks, then of blocks exponentially further back, ending with the genesis block
+         - Lets a peer find the latest block both chains share with a single message
+        """
+        locator: typing.List[str] = []
+
+        step = 1
+        height = len(self.chain) - 1
+
+        while height > 0:
+            locator.append(self.chain[height].hash())
+
+            if len(locator) >= 10:
+                step *= 2
+
+            height -= step
+
+        locator.append(self.chain[0].hash())
+
+        return locator
+
+    @reads
+    def get_headers(self, locator: typing.List[str], limit: int = MAX_HEADERS_PER_MESSAGE) -> typing.List[dict]:
+        """
+        Headers of the blocks after the first locator hash found in the chain, or from the genesis block if none is
+        """
+        start = 0
+
+        for block_hash in locator:
+            if block_hash in self.block_heights:
+                start = self.block_heights[block_hash] + 1
+                break
+
+        return [block.header() for block in self.chain[start:start + limit]]
+
+    @reads
+    def get_blocks(self, from_index: int, limit: int = MAX_BLOCKS_PER_MESSAGE) -> typing.List[Block]:
+        start = max(0, from_index - GENESIS_BLOCK_INDEX)
+
+        return self.chain[start:start + min(limit, MAX_BLOCKS_PER_MESSAGE)]
@@ -0,0 +1,247 @@
+import struct
+import typing
+
+from blockchain.block import Block
+from blockchain.transaction import Transaction, TransactionIn, TransactionOut, TransactionTypes
+
+"""
+Binary Codec
+ - Compact binary encoding of blocks and transactions, used on the wire and on disk; the HTTP API keeps using JSON
+ - Hex strings (ids, addresses, signatures) are stored as raw bytes, so a 64 byte public key takes 69 bytes (1 byte tag,
+   4 byte length and the key itself) instead of 128
+ - Amounts are stored as fixed point integers with AMOUNT_DECIMALS decimals when that is exact
+ - Everything decodes back to exactly what was encoded, including int vs float amounts and odd strings,
+   since transaction ids and signatures depend on it
+"""
+
+AMOUNT_DECIMALS = 8
+AMOUNT_SCALE = 10 ** AMOUNT_DECIMALS
+
+# Tags of the encoded strings
+STRING_HEX = 0
+STRING_TEXT = 1
+
+# Tags of the encoded amounts
+AMOUNT_INT = 0
+AMOUNT_FIXED = 1
+AMOUNT_FLOAT = 2
+
+TRANSACTION_TYPES = [TransactionTypes.COINBASE, TransactionTypes.STAKE, TransactionTypes.VALIDATOR, TransactionTypes.TRANSFER]
+
+# Binary P2P messages start with a zero byte (BINARY_MESSAGE_MARKER in p2p/constants.py), which never starts a JSON message,
+# followed by the message type
+MESSAGE_MAGIC = b'\x00'
+MESSAGE_TYPES = ['block_announce', 'blocks', 'new_transactions']
+
+INT = struct.Struct('>q')
+FLOAT = struct.Struct('>d')
+COUNT = struct.Struct('>I')
+TAG = struct.Struct('>B')
+
+
+class Writer():
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def write_int(self, value: int) -> None:
+        self.buffer += INT.pack(value)
+
+    def write_float(self, value: float) -> None:
+        self.buffer += FLOAT.pack(value)
+
+    def write_count(self, value: int) -> None:
+        self.buffer += COUNT.pack(value)
+
+    def write_tag(self, value: int) -> None:
+        self.buffer += TAG.pack(value)
+
+    def write_string(self, value: str) -> None:
+        try:
+            raw = bytes.fromhex(value)
+            tag = STRING_HEX if raw.hex() == value else STRING_TEXT
+
+        except ValueError:
+            tag = STRING_TEXT
+
+        if tag == STRING_TEXT:
+            raw = value.encode('utf-8')
+
+        self.write_tag(tag)
+        self.write_count(len(raw))
+        self.buffer += raw
+
+    def write_amount(self, value: typing.Union[int, float]) -> None:
+        if isinstance(value, int):
+            self.write_tag(AMOUNT_INT)
+            self.write_int(value)
+            return
+
+        fixed = round(value * AMOUNT_SCALE)
+
+        if abs(fixed) < 2 ** 63 and fixed / AMOUNT_SCALE == value:
+            self.write_tag(AMOUNT_FIXED)
+            self.write_int(fixed)
+        else:
+            self.write_tag(AMOUNT_FLOAT)
+            self.write_float(value)
+
+
+class Reader():
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def read(self, structure: struct.Struct):
+        value = structure.unpack_from(self.data, self.offset)[0]
+        self.offset += structure.size
+
+        return value
+
+    def read_int(self) -> int:
+        return self.read(INT)
+
+    def read_float(self) -> float:
+        return self.read(FLOAT)
+
+    def read_count(self) -> int:
+        return self.read(COUNT)
+
+    def read_tag(self) -> int:
+        return self.read(TAG)
+
+    def read_string(self) -> str:
+        tag = self.read_tag()
+        length = self.read_count()
+
+        raw = self.data[self.offset:self.offset + length]
+        self.offset += length
+
+        if tag == STRING_HEX:
+            return raw.hex()
+
+        return str(raw, 'utf-8')
+
+    def read_amount(self) -> typing.Union[int, float]:
+        tag = self.read_tag()
+
+        if tag == AMOUNT_INT:
+            return self.read_int()
+        elif tag == AMOUNT_FIXED:
+            return self.read_int() / AMOUNT_SCALE
+        else:
+            return self.read_float()
+
+
+def write_transaction(writer: Writer, transaction: Transaction) -> None:
+    writer.write_tag(TRANSACTION_TYPES.index(transaction.type))
+
+    writer.write_count(len(transaction.transaction_ins))
+    for transaction_in in transaction.transaction_ins:
+        writer.write_string(transaction_in.transaction_out_id)
+        writer.write_int(transaction_in.transaction_out_index)
+        writer.write_string(transaction_in.signature)
+
+    writer.write_count(len(transaction.transaction_outs))
+    for transaction_out in transaction.transaction_outs:
+        writer.write_string(transaction_out.address)
+        writer.write_amount(transaction_out.amount)
+
+
+def read_transaction(reader: Reader) -> Transaction:
+    transaction_type = TRANSACTION_TYPES[reader.read_tag()]
+
+    transaction_ins = [TransactionIn(reader.read_string(), reader.read_int(), reader.read_string()) for _ in range(reader.read_count())]
+    transaction_outs = [TransactionOut(reader.read_string(), reader.read_amount()) for _ in range(reader.read_count())]
+
+    return Transaction(transaction_ins, transaction_outs, transaction_type)
+
+
+def write_block(writer: Writer, block: Block) -> None:
+    writer.write_int(block.index)
+    writer.write_float(block.timestamp)
+    writer.write_string(block.previous_hash)
+    writer.write_int(block.difficulty)
+    writer.write_amount(block.minter_balance)
+    writer.write_string(block.minter_address)
+
+    writer.write_count(len(block.transactions))
+    for transaction in block.transactions:
+        write_transaction(writer, transaction)
+
+
+def read_block(reader: Reader) -> Block:
+    block = Block(reader.read_int(), '', 0, 0, '')
+    block.timestamp = reader.read_float()
+    block.previous_hash = reader.read_string()
+    block.difficulty = reader.read_int()
+    block.minter_balance = reader.read_amount()
+    block.minter_address = reader.read_string()
+
+    block.transactions = [read_transaction(reader) for _ in range(reader.read_count())]
+
+    return block
+
+
+def encode_transaction(transaction: Transaction) -> bytes:
+    writer = Writer()
+    write_transaction(writer, transaction)
+
+    return bytes(writer.buffer)
+
+
+def decode_transaction(data: bytes) -> Transaction:
+    return read_transaction(Reader(data))
+
+
+def encode_block(block: Block) -> bytes:
+    writer = Writer()
+    write_block(writer, block)
+
+    return bytes(writer.buffer)
+
+
+def decode_block(data: bytes) -> Block:
+    return read_block(Reader(data))
+
+
+def encode_message(message: dict) -> typing.Union[bytes, None]:
+    """
+    Binary form of the P2P messages that carry blocks or transactions, or None for any other message
+    """
+    if message['event'] not in MESSAGE_TYPES:
+        return None
+
+    writer = Writer()
+    writer.buffer += MESSAGE_MAGIC
+    writer.write_tag(MESSAGE_TYPES.index(message['event']))
+
+    if message['event'] == 'block_announce':
+        write_block(writer, message['block'])
+    elif message['event'] == 'blocks':
+        writer.write_count(len(message['blocks']))
+        for block in message['blocks']:
+            write_block(writer, block)
+    else:
+        writer.write_count(len(message['transactions']))
+        for transaction in message['transactions']:
+            write_transaction(writer, transaction)
+
+    return bytes(writer.buffer)
+
+
+def is_message(data) -> bool:
+    return isinstance(data, (bytes, bytearray)) and data[:1] == MESSAGE_MAGIC
+
+
+def decode_message(data: bytes) -> dict:
+    reader = Reader(data)
+    reader.offset = len(MESSAGE_MAGIC)
+
+    event = MESSAGE_TYPES[reader.read_tag()]
+
+    if event == 'block_announce':
+        return {'event': event, 'block': read_block(reader)}
+    elif event == 'blocks':
+        return {'event': event, 'blocks': [read_block(reader) for _ in range(reader.read_count())]}
+
+    return {'event': event, 'transactions': [read_transaction(reader) for _ in range(reader.read_count())]}
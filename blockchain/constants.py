@@ -10,4 +10,49 @@ OWNER_INIT_STAKE = 5
 CHAIN_ADDRESS = '00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000'
 
 BLOCK_GENERATION_INTERVAL = 5
-DIFFICULTY_ADJUSTMENT_ITNERVAL = 10
\ No newline at end of file
+DIFFICULTY_ADJUSTMENT_ITNERVAL = 10
+
+# Length in seconds of the timestamp slots used for proof of stake; a minter gets one attempt per slot
+STAKE_TIMESTAMP_INTERVAL = 1000
+
+# Signature batches smaller than this are verified in process, larger ones are split into chunks across a process pool
+PARALLEL_VERIFICATION_THRESHOLD = 16
+VERIFICATION_CHUNK_SIZE = 8
+
+# Number of successfully verified signatures remembered by the signature cache
+SIGNATURE_CACHE_SIZE = 100000
+
+# The block store snapshots the UTXO set and account index every SNAPSHOT_INTERVAL blocks, and keeps the latest SNAPSHOTS_KEPT
+SNAPSHOT_INTERVAL = 100
+SNAPSHOTS_KEPT = 2
+
+# Upper bounds on the number of headers and blocks sent in one sync message
+MAX_HEADERS_PER_MESSAGE = 200
+MAX_BLOCKS_PER_MESSAGE = 200
+
+# Seconds a fork being downloaded from a peer waits for the peer's next headers or blocks before it can be restarted
+SYNC_REQUEST_TIMEOUT = 10
+
+# Largest number of transactions kept in the mempool; the oldest ones are evicted to make room
+MEMPOOL_MAX_SIZE = 5000
+
+# New transactions are relayed to the peers in batches, sent every TRANSACTION_RELAY_INTERVAL seconds or once
+# MAX_TRANSACTIONS_PER_MESSAGE of them are waiting
+TRANSACTION_RELAY_INTERVAL = 0.1
+MAX_TRANSACTIONS_PER_MESSAGE = 1000
+
+# Page size of the paginated /blocks and /transactions endpoints, and the largest page a client can ask for
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Events queued for a live update subscriber before it is considered too slow and told to resync
+EVENT_QUEUE_SIZE = 1000
+
+# Gossip: new transactions and blocks are announced to GOSSIP_FANOUT peers at once and to the rest GOSSIP_DELAY seconds later,
+# the ids of the last GOSSIP_SEEN_SIZE received ones are remembered, and so are the last GOSSIP_KNOWN_SIZE ids each peer is
+# known to have. Items asked for are not asked for again from another peer for GOSSIP_REQUEST_TIMEOUT seconds
+GOSSIP_FANOUT = 8
+GOSSIP_DELAY = 0.5
+GOSSIP_SEEN_SIZE = 50000
+GOSSIP_KNOWN_SIZE = 5000
+GOSSIP_REQUEST_TIMEOUT = 5
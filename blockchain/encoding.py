@@ -0,0 +1,24 @@
+import struct
+
+"""
+Canonical Encoding
+ - Deterministic byte encoding of the values that make up blocks and transactions
+ - Strings are length prefixed, integers are signed 64 bit and amounts are 64 bit floats, all big endian,
+   so equal values always encode to the same bytes whatever their JSON representation was
+"""
+
+def encode_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return struct.pack('>I', len(encoded)) + encoded
+
+
+def encode_int(value: int) -> bytes:
+    return struct.pack('>q', value)
+
+
+def encode_float(value: float) -> bytes:
+    return struct.pack('>d', value)
+
+
+def encode_count(value: int) -> bytes:
+    return struct.pack('>I', value)
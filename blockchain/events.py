@@ -0,0 +1,59 @@
+import queue
+import typing
+import threading
+
+from blockchain.constants import EVENT_QUEUE_SIZE
+
+class EventStream():
+    """
+    Event Stream
+     - Publishes what changes on the node (blocks added and removed, mempool adds and removes, peers) to live subscribers,
+       such as the /events endpoint
+     - Every subscriber gets its own bounded queue; publishing never blocks
+     - A subscriber that falls EVENT_QUEUE_SIZE events behind has its queue replaced by a single resync event,
+       telling it to fetch the current state again
+     - Events are (name, data) tuples, with data serialized by the subscriber
+    """
+    def __init__(self, max_queued: int = EVENT_QUEUE_SIZE) -> None:
+        self.max_queued = max_queued
+
+        self.subscribers: typing.List[queue.Queue] = []
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return len(self.subscribers) > 0
+
+    def subscribe(self) -> queue.Queue:
+        subscription = queue.Queue(self.max_queued)
+
+        with self.lock:
+            self.subscribers.append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: queue.Queue) -> None:
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def publish(self, event: str, data: typing.Any = None) -> None:
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+
+            except queue.Full:
+                EventStream.reset(subscription)
+
+    @staticmethod
+    def reset(subscription: queue.Queue) -> None:
+        with subscription.mutex:
+            subscription.queue.clear()
+
+        subscription.put_nowait(('resync', None))
+
+
+event_stream = EventStream()
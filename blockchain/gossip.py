@@ -0,0 +1,239 @@
+import collections
+import random
+import threading
+import time
+import typing
+import weakref
+
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+from blockchain.constants import GOSSIP_DELAY, GOSSIP_FANOUT, GOSSIP_KNOWN_SIZE, GOSSIP_REQUEST_TIMEOUT, GOSSIP_SEEN_SIZE
+from blockchain.relay import TransactionRelay
+from blockchain.sync import ChainSync
+from blockchain.transaction import Transaction
+
+class SeenSet():
+    """
+    Seen Set
+     - Bounded LRU of message ids; the least recently seen ones are forgotten once it holds max_size of them
+    """
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: typing.OrderedDict[str, None] = collections.OrderedDict()
+
+    def add(self, id: str) -> None:
+        self.entries[id] = None
+        self.entries.move_to_end(id)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class Gossip():
+    """
+    Gossip
+     - Spreads new transactions and blocks through the network, also to the nodes that are not connected to where they came from
+     - Transaction ids and block hashes are the message ids. New ones are announced by id (inv) to up to fanout peers that
+       are not known to have them, a peer asks for the ones it has not seen yet (getdata), and announces them on in turn once
+       it has accepted them, so they reach every node in O(log N) hops
+     - The remaining peers are announced to GOSSIP_DELAY seconds later, by when most of them have heard of the items from
+       another peer; this keeps nodes that are only reachable through this one from missing them
+     - The ids already received are remembered in a bounded seen set, and the ids asked for are not asked for again from
+       another peer unless GOSSIP_REQUEST_TIMEOUT passes without them arriving, so each node fetches every item about once
+     - Transactions are announced in batches by the transaction relay; blocks are announced as soon as they are added
+     - Transactions are sent as new_transactions messages and blocks as block announcements, which ChainSync handles
+    """
+    EVENTS = ('inv', 'getdata', 'new_transaction', 'new_transactions')
+
+    def __init__(self, blockchain: Blockchain, sync: ChainSync, fanout: int = GOSSIP_FANOUT) -> None:
+        self.blockchain = blockchain
+        self.sync = sync
+
+        self.fanout = fanout
+
+        self.seen = SeenSet(GOSSIP_SEEN_SIZE)
+        self.requested: typing.OrderedDict[str, float] = collections.OrderedDict()
+
+        # Ids each peer announced to us or was announced by us, dropped along with the connection
+        self.known: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+        self.timers: typing.Set[threading.Timer] = set()
+        self.lock = threading.Lock()
+
+        self.relay = TransactionRelay(self.announce_transactions)
+
+        self.received = 0
+        self.duplicates = 0
+
+    def start(self) -> None:
+        self.relay.start()
+
+    def stop(self) -> None:
+        self.relay.stop()
+
+        with self.lock:
+            for timer in self.timers:
+                timer.cancel()
+
+    def add_transaction(self, transaction: Transaction) -> None:
+        """
+        Announce a transaction added to the pool, in the next batch of the transaction relay
+        """
+        with self.lock:
+            self.seen.add(transaction.id)
+
+        self.relay.add(transaction)
+
+    def announce_transactions(self, transactions: typing.List[Transaction]) -> None:
+        self.announce('transactions', [transaction.id for transaction in transactions], self.fanout)
+
+    def announce_block(self, block: Block) -> None:
+        """
+        Announce a block minted by this node, received from a peer, or at the tip of the chain after a sync
+        """
+        block_hash = block.hash()
+
+        with self.lock:
+            self.requested.pop(block_hash, None)
+            self.seen.add(block_hash)
+
+        self.announce('blocks', [block_hash], self.fanout)
+
+    def announce(self, kind: str, ids: typing.List[str], fanout: typing.Union[int, None] = None) -> None:
+        # Stopped connections would count toward the fanout without passing anything on
+        connections = [connection for connection in self.sync.node.connections if not connection.closed]
+        random.shuffle(connections)
+
+        announced = 0
+
+        for connection in connections:
+            if fanout is not None and announced == fanout:
+                # The other peers are told later, unless one of their own peers tells them first
+                timer = threading.Timer(GOSSIP_DELAY, self.announce_delayed, (kind, ids))
+                timer.daemon = True
+
+                with self.lock:
+                    self.timers.add(timer)
+
+                timer.start()
+                break
+
+            with self.lock:
+                known = self.get_known(connection)
+                new_ids = [id for id in ids if id not in known]
+
+                for id in new_ids:
+                    known.add(id)
+
+            if len(new_ids) > 0:
+                # A peer that has not been sent the previous block announcement yet only needs the newest one, and syncs
+                # the blocks before it from its headers
+                self.sync.send(connection, {'event': 'inv', kind: new_ids}, 'inv_blocks' if kind == 'blocks' else None)
+                announced += 1
+
+    def announce_delayed(self, kind: str, ids: typing.List[str]) -> None:
+        with self.lock:
+            self.timers.discard(threading.current_thread())
+
+        self.announce(kind, ids)
+
+    def get_known(self, connection) -> SeenSet:
+        if connection not in self.known:
+            self.known[connection] = SeenSet(GOSSIP_KNOWN_SIZE)
+
+        return self.known[connection]
+
+    def handle_message(self, message: dict, connection) -> None:
+        if message['event'] == 'inv':
+            self.handle_inv(message, connection)
+        elif message['event'] == 'getdata':
+            self.handle_getdata(message, connection)
+        elif message['event'] == 'new_transaction':
+            self.handle_transactions([message['transaction']], connection)
+        elif message['event'] == 'new_transactions':
+            self.handle_transactions(message['transactions'], connection)
+
+    def handle_inv(self, message: dict, connection) -> None:
+        wanted = {}
+        now = time.monotonic()
+
+        with self.lock:
+            known = self.get_known(connection)
+
+            # Requests that timed out are forgotten, so the items can be asked for from another peer
+            while len(self.requested) > 0 and next(iter(self.requested.values())) < now - GOSSIP_REQUEST_TIMEOUT:
+                self.requested.popitem(last=False)
+
+            for kind in ('transactions', 'blocks'):
+                wanted[kind] = []
+
+                for id in message.get(kind, []):
+                    known.add(id)
+
+                    if id in self.seen or id in self.requested or (kind == 'blocks' and id in self.blockchain.block_heights):
+                        continue
+
+                    self.requested[id] = now
+                    wanted[kind].append(id)
+
+        if len(wanted['transactions']) > 0 or len(wanted['blocks']) > 0:
+            self.sync.send(connection, {'event': 'getdata', **wanted})
+
+    def handle_getdata(self, message: dict, connection) -> None:
+        # Transactions that left the pool in the meantime are not sent
+        transactions = [self.blockchain.transaction_pool.get(id) for id in message.get('transactions', [])]
+        transactions = [transaction for transaction in transactions if transaction is not None]
+
+        if len(transactions) > 0:
+            self.sync.send(connection, {
+                'event': 'new_transactions',
+                'transactions': transactions
+            })
+
+        for block_hash in message.get('blocks', []):
+            block = self.blockchain.get_block(block_hash)
+
+            if block is not None:
+                self.sync.announce_block(block, connection)
+
+    def handle_transactions(self, transactions_data: list, connection) -> None:
+        accepted = []
+
+        for transaction_data in transactions_data:
+            transaction = Transaction.from_data(transaction_data)
+            transaction_id = transaction.id
+
+            with self.lock:
+                self.get_known(connection).add(transaction_id)
+                self.requested.pop(transaction_id, None)
+
+                self.received += 1
+
+                if transaction_id in self.seen:
+                    self.duplicates += 1
+                    continue
+
+                self.seen.add(transaction_id)
+
+            if self.blockchain.add_transaction(transaction):
+                accepted.append(transaction)
+
+        # Only transactions this node accepted are passed on, so invalid ones stop at the first node
+        for transaction in accepted:
+            self.relay.add(transaction)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'seen': len(self.seen),
+                'requested': len(self.requested),
+                'received': self.received,
+                'duplicates': self.duplicates,
+                'fanout': self.fanout
+            }
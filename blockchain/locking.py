@@ -0,0 +1,165 @@
+import time
+import typing
+import functools
+import threading
+
+from contextlib import contextmanager
+
+class ReadWriteLock():
+    """
+    Read Write Lock
+     - Any number of readers share the lock, a writer holds it alone
+     - Writers are preferred: once a writer waits, new readers wait behind it, so block application is never starved
+     - Reentrant: a thread holding the write lock may take it again or take the read lock, and a thread holding
+       the read lock may take it again
+     - Counts acquisitions and how long they waited, and how long the write lock was held, see stats()
+    """
+    def __init__(self) -> None:
+        self.condition = threading.Condition(threading.Lock())
+
+        self.readers = 0
+        self.writer: typing.Union[int, None] = None
+        self.write_depth = 0
+        self.waiting_writers = 0
+
+        # Read lock depth of the current thread
+        self.local = threading.local()
+
+        self.read_acquisitions = 0
+        self.write_acquisitions = 0
+        self.contended_reads = 0
+        self.contended_writes = 0
+        self.read_wait_time = 0.0
+        self.write_wait_time = 0.0
+        self.max_read_wait_time = 0.0
+        self.max_write_wait_time = 0.0
+        self.write_hold_time = 0.0
+        self.max_write_hold_time = 0.0
+
+        self.write_acquired_at = 0.0
+
+    def acquire_read(self) -> None:
+        depth = getattr(self.local, 'depth', 0)
+
+        with self.condition:
+            if depth > 0 or self.writer == threading.get_ident():
+                self.local.depth = depth + 1
+                self.readers += 1
+                return
+
+            start = time.perf_counter()
+            contended = self.writer is not None or self.waiting_writers > 0
+
+            while self.writer is not None or self.waiting_writers > 0:
+                self.condition.wait()
+
+            self.readers += 1
+            self.local.depth = 1
+
+            wait_time = time.perf_counter() - start
+            self.read_acquisitions += 1
+            if contended:
+                self.contended_reads += 1
+                self.read_wait_time += wait_time
+                self.max_read_wait_time = max(self.max_read_wait_time, wait_time)
+
+    def release_read(self) -> None:
+        with self.condition:
+            self.readers -= 1
+            self.local.depth -= 1
+
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self) -> None:
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.write_depth += 1
+                return
+
+            # A reader cannot upgrade, it would wait for itself
+            if getattr(self.local, 'depth', 0) > 0:
+                raise RuntimeError('Cannot take the write lock while holding the read lock')
+
+            start = time.perf_counter()
+            contended = self.writer is not None or self.readers > 0
+
+            self.waiting_writers += 1
+            while self.writer is not None or self.readers > 0:
+                self.condition.wait()
+            self.waiting_writers -= 1
+
+            self.writer = threading.get_ident()
+            self.write_depth = 1
+
+            self.write_acquired_at = time.perf_counter()
+
+            wait_time = self.write_acquired_at - start
+            self.write_acquisitions += 1
+            if contended:
+                self.contended_writes += 1
+                self.write_wait_time += wait_time
+                self.max_write_wait_time = max(self.max_write_wait_time, wait_time)
+
+    def release_write(self) -> None:
+        with self.condition:
+            self.write_depth -= 1
+
+            if self.write_depth == 0:
+                hold_time = time.perf_counter() - self.write_acquired_at
+                self.write_hold_time += hold_time
+                self.max_write_hold_time = max(self.max_write_hold_time, hold_time)
+
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                'read_acquisitions': self.read_acquisitions,
+                'write_acquisitions': self.write_acquisitions,
+                'contended_reads': self.contended_reads,
+                'contended_writes': self.contended_writes,
+                'read_wait_seconds': self.read_wait_time,
+                'write_wait_seconds': self.write_wait_time,
+                'max_read_wait_seconds': self.max_read_wait_time,
+                'max_write_wait_seconds': self.max_write_wait_time,
+                'write_hold_seconds': self.write_hold_time,
+                'max_write_hold_seconds': self.max_write_hold_time,
+            }
+
+
+def reads(method):
+    # Runs the method holding the read lock of its object's lock attribute
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def writes(method):
+    # Runs the method holding the write lock of its object's lock attribute
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+
+    return wrapper
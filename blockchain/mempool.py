@@ -0,0 +1,136 @@
+import typing
+import threading
+
+from collections import OrderedDict
+
+from blockchain.constants import MEMPOOL_MAX_SIZE
+from blockchain.events import event_stream
+from blockchain.transaction import Transaction, TransactionTypes, UnspentTransactionOutSet
+
+class Mempool():
+    """
+    Mempool
+     - Transactions waiting to be minted, kept in arrival order since there are no fees to prioritize them by
+     - Indexed by id and by the transaction outs their inputs spend, so duplicates and double spends are rejected in O(1)
+     - Transactions are validated against the UTXO set when they enter
+     - Once it holds max_size transactions, the oldest ones are evicted to make room
+     - When a block is added to the chain only the transactions it includes, or conflicts with, are removed
+    """
+    def __init__(self, max_size: int = MEMPOOL_MAX_SIZE) -> None:
+        self.max_size = max_size
+
+        self.transactions: typing.Dict[str, Transaction] = OrderedDict()
+
+        # Id of the pooled transaction spending each transaction out, keyed by (transaction_out_id, transaction_out_index)
+        self.spent_transaction_outs: typing.Dict[typing.Tuple[str, int], str] = {}
+
+        self.evicted = 0
+
+        self.lock = threading.Lock()
+
+    def add(self, transaction: Transaction, unspent_transaction_outs: UnspentTransactionOutSet) -> bool:
+        """
+        Add a transaction if it is valid against the UTXO set and does not conflict with a pooled one
+        """
+        if transaction.type == TransactionTypes.COINBASE or len(transaction.transaction_ins) == 0:
+            return False
+
+        keys = [(transaction_in.transaction_out_id, transaction_in.transaction_out_index) for transaction_in in transaction.transaction_ins]
+        if not len(set(keys)) == len(keys):
+            return False
+
+        if transaction.id in self.transactions or any(key in self.spent_transaction_outs for key in keys):
+            return False
+
+        if not transaction.validate(unspent_transaction_outs):
+            return False
+
+        with self.lock:
+            # Checked again, another transaction may have been added while this one was validated
+            if transaction.id in self.transactions or any(key in self.spent_transaction_outs for key in keys):
+                return False
+
+            while len(self.transactions) >= self.max_size:
+                self.remove_locked(next(iter(self.transactions)))
+                self.evicted += 1
+
+            self.transactions[transaction.id] = transaction
+            for key in keys:
+                self.spent_transaction_outs[key] = transaction.id
+
+        event_stream.publish('pool_add', transaction)
+
+        return True
+
+    def remove(self, transaction_id: str) -> typing.Union[Transaction, None]:
+        with self.lock:
+            return self.remove_locked(transaction_id)
+
+    def remove_locked(self, transaction_id: str) -> typing.Union[Transaction, None]:
+        transaction = self.transactions.pop(transaction_id, None)
+
+        if transaction is not None:
+            for transaction_in in transaction.transaction_ins:
+                self.spent_transaction_outs.pop((transaction_in.transaction_out_id, transaction_in.transaction_out_index), None)
+
+            event_stream.publish('pool_remove', transaction_id)
+
+        return transaction
+
+    def remove_included(self, transactions: typing.List[Transaction]) -> None:
+        """
+        Remove the transactions of a block, along with the pooled transactions spending the same transaction outs
+        """
+        with self.lock:
+            for transaction in transactions:
+                self.remove_locked(transaction.id)
+
+                for transaction_in in transaction.transaction_ins:
+                    conflicting_id = self.spent_transaction_outs.get((transaction_in.transaction_out_id, transaction_in.transaction_out_index))
+
+                    if conflicting_id is not None:
+                        self.remove_locked(conflicting_id)
+
+    def prune(self, unspent_transaction_outs: UnspentTransactionOutSet) -> None:
+        """
+        Remove the transactions spending transaction outs that are no longer unspent, e.g. after the chain switched to a fork
+        """
+        with self.lock:
+            stale_ids = {transaction_id for (key, transaction_id) in self.spent_transaction_outs.items() if key not in unspent_transaction_outs}
+
+            for transaction_id in stale_ids:
+                self.remove_locked(transaction_id)
+
+    def get(self, transaction_id: str) -> typing.Union[Transaction, None]:
+        return self.transactions.get(transaction_id)
+
+    def is_spent(self, transaction_out_id: str, transaction_out_index: int) -> bool:
+        return (transaction_out_id, transaction_out_index) in self.spent_transaction_outs
+
+    def get_transactions(self) -> typing.List[Transaction]:
+        with self.lock:
+            return list(self.transactions.values())
+
+    def clear(self) -> None:
+        with self.lock:
+            for transaction_id in list(self.transactions):
+                self.remove_locked(transaction_id)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.transactions),
+            'max_size': self.max_size,
+            'evicted': self.evicted
+        }
+
+    def to_json(self) -> list:
+        return [transaction.to_json() for transaction in self.get_transactions()]
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return transaction_id in self.transactions
+
+    def __iter__(self) -> typing.Iterator[Transaction]:
+        return iter(self.get_transactions())
+
+    def __len__(self) -> int:
+        return len(self.transactions)
@@ -0,0 +1,51 @@
+import typing
+import threading
+
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+
+from wallet.wallet import Wallet
+
+class Minter():
+    """
+    Minter
+     - Runs minting attempts on a background thread, so that the /mint request returns immediately
+     - An attempt sleeps until the next eligible timestamp slot instead of spinning
+     - cancel() abandons the running attempt, for example when a competing block arrives
+     - callback is called with the new block once it has been added to the chain
+    """
+    def __init__(self, blockchain: Blockchain, wallet: Wallet, callback: typing.Callable[[Block], None] = None) -> None:
+        self.blockchain = blockchain
+        self.wallet = wallet
+
+        self.callback = callback
+
+        self.cancel_event = threading.Event()
+        self.thread: typing.Union[threading.Thread, None] = None
+
+        self.lock = threading.Lock()
+
+    @property
+    def is_minting(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> bool:
+        with self.lock:
+            if self.is_minting:
+                return False
+
+            self.cancel_event.clear()
+
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+            return True
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def run(self) -> None:
+        new_block = self.blockchain.create_new_block(self.wallet, self.cancel_event)
+
+        if new_block is not None and self.callback is not None:
+            self.callback(new_block)
@@ -0,0 +1,55 @@
+import typing
+import threading
+
+from blockchain.constants import MAX_TRANSACTIONS_PER_MESSAGE, TRANSACTION_RELAY_INTERVAL
+from blockchain.transaction import Transaction
+
+class TransactionRelay():
+    """
+    Transaction Relay
+     - Coalesces the new transactions to relay to the peers into one batch per interval, instead of one message per transaction
+     - A batch is sent early once it reaches MAX_TRANSACTIONS_PER_MESSAGE transactions
+     - announce is called with every batch, to tell the peers about the transactions in it
+    """
+    def __init__(self, announce: typing.Callable[[typing.List[Transaction]], None], interval: float = TRANSACTION_RELAY_INTERVAL) -> None:
+        self.announce = announce
+        self.interval = interval
+
+        self.pending: typing.List[Transaction] = []
+        self.lock = threading.Lock()
+
+        self.flush_event = threading.Event()
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def add(self, transaction: Transaction) -> None:
+        with self.lock:
+            self.pending.append(transaction)
+
+            if len(self.pending) >= MAX_TRANSACTIONS_PER_MESSAGE:
+                self.flush_event.set()
+
+    def flush(self) -> None:
+        with self.lock:
+            (transactions, self.pending) = (self.pending, [])
+
+        for i in range(0, len(transactions), MAX_TRANSACTIONS_PER_MESSAGE):
+            self.announce(transactions[i:i + MAX_TRANSACTIONS_PER_MESSAGE])
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.flush_event.set()
+
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            self.flush_event.wait(self.interval)
+            self.flush_event.clear()
+
+            self.flush()
@@ -0,0 +1,73 @@
+import json
+import typing
+import sqlite3
+import threading
+
+from blockchain.block import Block
+from blockchain.codec import encode_block, decode_block
+from blockchain.constants import SNAPSHOTS_KEPT
+
+class BlockStore():
+    """
+    Block Store
+     - Persists the chain in a sqlite database, so that a node restarts from disk instead of resyncing from its peers
+     - blocks holds every block of the chain, in the binary codec, with its undo record, keyed by its height (position in the chain)
+     - snapshots holds the UTXO set and account index as they were after a given height
+     - Rolled back blocks are deleted along with any snapshot taken after them
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS blocks (height INTEGER PRIMARY KEY, hash TEXT NOT NULL, block BLOB NOT NULL, undo TEXT NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS snapshots (height INTEGER PRIMARY KEY, unspent_transaction_outs TEXT NOT NULL, accounts TEXT NOT NULL)')
+        self.connection.commit()
+
+    def get_height(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM blocks').fetchone()[0]
+
+    def append_block(self, height: int, block_hash: str, block: Block, undo: dict) -> None:
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO blocks (height, hash, block, undo) VALUES (?, ?, ?, ?)', (height, block_hash, encode_block(block), json.dumps(undo)))
+            self.connection.commit()
+
+    def truncate(self, height: int) -> None:
+        # Keep only the first `height` blocks
+        with self.lock:
+            self.connection.execute('DELETE FROM blocks WHERE height >= ?', (height,))
+            self.connection.execute('DELETE FROM snapshots WHERE height > ?', (height,))
+            self.connection.commit()
+
+    def load_blocks(self, start: int = 0) -> typing.Iterator[typing.Tuple[Block, dict]]:
+        with self.lock:
+            rows = self.connection.execute('SELECT block, undo FROM blocks WHERE height >= ? ORDER BY height', (start,)).fetchall()
+
+        for (block, undo) in rows:
+            # Stores written before the binary codec hold the blocks as JSON text
+            if isinstance(block, str):
+                yield Block.from_dict(json.loads(block)), json.loads(undo)
+            else:
+                yield decode_block(block), json.loads(undo)
+
+    def save_snapshot(self, height: int, unspent_transaction_outs: list, accounts: dict) -> None:
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO snapshots (height, unspent_transaction_outs, accounts) VALUES (?, ?, ?)', (height, json.dumps(unspent_transaction_outs), json.dumps(accounts)))
+            self.connection.execute('DELETE FROM snapshots WHERE height NOT IN (SELECT height FROM snapshots ORDER BY height DESC LIMIT ?)', (SNAPSHOTS_KEPT,))
+            self.connection.commit()
+
+    def load_snapshot(self) -> typing.Union[typing.Tuple[int, list, dict], None]:
+        with self.lock:
+            row = self.connection.execute('SELECT height, unspent_transaction_outs, accounts FROM snapshots ORDER BY height DESC LIMIT 1').fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,208 @@
+import time
+import typing
+import threading
+import weakref
+
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+from blockchain.codec import encode_message
+from blockchain.constants import MAX_BLOCKS_PER_MESSAGE, MAX_HEADERS_PER_MESSAGE, SYNC_REQUEST_TIMEOUT
+from p2p.framing import FRAMING_LENGTH
+
+class ChainSync():
+    """
+    Chain Sync
+     - Headers first chain sync over the P2P node, so peers only exchange the blocks they are missing
+     - New blocks propagate as a single block announcement
+     - A peer that cannot connect an announced block sends its locator (get_headers), gets back the headers after
+       the latest block both chains share (headers), and fetches the new blocks by range (get_blocks, blocks)
+     - Blocks that extend the local tip are applied a message at a time. A fork is downloaded whole: its headers are
+       collected across messages up to the peer's tip, and only if the whole fork outweighs the local blocks it replaces
+       are its blocks fetched and applied together, since no single message of it has to
+     - callback is called whenever blocks received from a peer are applied to the chain
+     - Messages carrying blocks are sent in the binary codec to peers using length framing, and as JSON otherwise
+    """
+    EVENTS = ('block_announce', 'get_headers', 'headers', 'get_blocks', 'blocks')
+
+    def __init__(self, blockchain: Blockchain, node, callback: typing.Callable[[], None] = None) -> None:
+        self.blockchain = blockchain
+        self.node = node
+
+        self.callback = callback
+
+        # Fork being downloaded from each peer, as its headers, the blocks fetched so far and when the peer last answered
+        self.downloads: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def announce_block(self, block, connection=None) -> None:
+        message = {
+            'event': 'block_announce',
+            'block': block
+        }
+
+        if connection is None:
+            self.broadcast(message)
+        else:
+            self.send(connection, message)
+
+    def send(self, connection, message: dict, key: str = None) -> None:
+        if connection.framing == FRAMING_LENGTH:
+            payload = encode_message(message)
+
+            if payload is not None:
+                self.node.send_to_node(connection, payload, key)
+                return
+
+        self.node.send_to_node(connection, message, key)
+
+    def broadcast(self, message: dict) -> None:
+        self.node.messages_sent += 1
+
+        # Encoded once for all the peers using the binary codec
+        payload = encode_message(message)
+
+        for connection in list(self.node.connections):
+            if payload is not None and connection.framing == FRAMING_LENGTH:
+                self.node.send_to_node(connection, payload)
+            else:
+                self.node.send_to_node(connection, message)
+
+    def request_headers(self, connection) -> None:
+        # A newer locator makes a request still waiting to be sent redundant
+        self.node.send_to_node(connection, {
+            'event': 'get_headers',
+            'locator': self.blockchain.get_locator()
+        }, 'get_headers')
+
+    def handle_message(self, message: dict, connection) -> None:
+        if message['event'] == 'block_announce':
+            self.handle_block_announce(message['block'], connection)
+        elif message['event'] == 'get_headers':
+            self.node.send_to_node(connection, {
+                'event': 'headers',
+                'headers': self.blockchain.get_headers(message['locator'])
+            })
+        elif message['event'] == 'headers':
+            self.handle_headers(message['headers'], connection)
+        elif message['event'] == 'get_blocks':
+            self.send(connection, {
+                'event': 'blocks',
+                'blocks': self.blockchain.get_blocks(message['from'], message['limit'])
+            })
+        elif message['event'] == 'blocks':
+            self.handle_blocks(message['blocks'], connection)
+
+    def handle_block_announce(self, block_data: dict, connection) -> None:
+        # A block that builds on a block we have is applied directly, anything else needs the headers in between
+        block = Block.from_data(block_data)
+
+        if block.previous_hash in self.blockchain.block_heights:
+            if self.blockchain.apply_blocks([block]):
+                self.chain_updated()
+        elif self.get_download(connection) is None:
+            # A fork still being downloaded from the peer asks for its newer headers once it is applied
+            self.request_headers(connection)
+
+    def get_download(self, connection) -> typing.Union[dict, None]:
+        with self.lock:
+            download = self.downloads.get(connection)
+
+            if download is not None and download['updated'] < time.monotonic() - SYNC_REQUEST_TIMEOUT:
+                del self.downloads[connection]
+                return None
+
+            return download
+
+    def handle_headers(self, headers: typing.List[dict], connection) -> None:
+        download = self.get_download(connection)
+
+        if download is not None and len(download['blocks']) == 0 and (len(headers) == 0 or headers[0]['previous_hash'] == download['headers'][-1]['hash']):
+            download['headers'].extend(headers)
+        else:
+            with self.blockchain.lock.read():
+                new_headers = [header for header in headers if header['hash'] not in self.blockchain.block_heights]
+
+                if len(new_headers) > 0 and new_headers[0]['previous_hash'] in self.blockchain.block_heights:
+                    common_length = self.blockchain.block_heights[new_headers[0]['previous_hash']] + 1
+                else:
+                    common_length = 0
+
+                extends_tip = common_length == len(self.blockchain.chain)
+
+            with self.lock:
+                self.downloads.pop(connection, None)
+
+            if len(new_headers) == 0:
+                return
+
+            if extends_tip:
+                self.node.send_to_node(connection, {
+                    'event': 'get_blocks',
+                    'from': new_headers[0]['index'],
+                    'limit': len(new_headers)
+                })
+                return
+
+            download = {'common_length': common_length, 'headers': new_headers, 'blocks': [], 'updated': time.monotonic()}
+
+            with self.lock:
+                self.downloads[connection] = download
+
+        download['updated'] = time.monotonic()
+
+        # A full message means the peer has more headers after the last one
+        if len(headers) == MAX_HEADERS_PER_MESSAGE:
+            self.node.send_to_node(connection, {
+                'event': 'get_headers',
+                'locator': [download['headers'][-1]['hash']]
+            }, 'get_headers')
+            return
+
+        with self.blockchain.lock.read():
+            local_difficulty = Blockchain.get_accumulated_difficulty(self.blockchain.chain[download['common_length']:])
+
+        # A fork with less accumulated difficulty is not worth fetching
+        if Blockchain.get_accumulated_header_difficulty(download['headers']) < local_difficulty:
+            with self.lock:
+                self.downloads.pop(connection, None)
+
+            return
+
+        self.request_blocks(connection, download)
+
+    def request_blocks(self, connection, download: dict) -> None:
+        start = len(download['blocks'])
+
+        self.node.send_to_node(connection, {
+            'event': 'get_blocks',
+            'from': download['headers'][start]['index'],
+            'limit': min(len(download['headers']) - start, MAX_BLOCKS_PER_MESSAGE)
+        })
+
+    def handle_blocks(self, blocks_data: typing.List[dict], connection) -> None:
+        download = self.get_download(connection)
+
+        if download is not None and len(download['headers']) > len(download['blocks']):
+            download['blocks'].extend(blocks_data)
+            download['updated'] = time.monotonic()
+
+            if len(blocks_data) > 0 and len(download['headers']) > len(download['blocks']):
+                self.request_blocks(connection, download)
+                return
+
+            with self.lock:
+                self.downloads.pop(connection, None)
+
+            blocks_data = download['blocks']
+
+        if len(blocks_data) == 0 or not self.blockchain.apply_blocks(blocks_data):
+            return
+
+        self.chain_updated()
+
+        # The peer may have more blocks than fit in one message
+        self.request_headers(connection)
+
+    def chain_updated(self) -> None:
+        if self.callback is not None:
+            self.callback()
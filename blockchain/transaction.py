@@ -1,15 +1,14 @@
 from os import error
+import math
 import typing
 import hashlib
 
 from enum import Enum
 from functools import reduce
 
-from ellipticcurve.ecdsa import Ecdsa
-from ellipticcurve.signature import Signature
-from ellipticcurve.publicKey import PublicKey
-
 from blockchain.constants import COINBASE_AMOUNT, GENESIS_BLOCK_INDEX, OWNER_INIT_AMOUNT
+from blockchain.encoding import encode_count, encode_float, encode_int, encode_string
+from blockchain.verification import SignatureJob, signature_verifier
 
 class TransactionTypes(Enum):
     COINBASE = 'coinbase'
@@ -31,34 +30,164 @@ class TransactionTypes(Enum):
             return TransactionTypes.TRANSFER
 
 
-class UnspentTransactionOut(dict):
+class UnspentTransactionOut():
+    __slots__ = ('transaction_out_id', 'transaction_out_index', 'address', 'amount')
+
     def __init__(self, transaction_out_id: str, transaction_out_index: int, address: str, amount: float) -> None:
         self.transaction_out_id = transaction_out_id
         self.transaction_out_index = transaction_out_index
         self.address = address
         self.amount = amount
 
-        dict.__init__(self, transaction_out_id=self.transaction_out_id, transaction_out_index=self.transaction_out_index, address=self.address, amount=self.amount)
+    def to_json(self) -> dict:
+        return {'transaction_out_id': self.transaction_out_id, 'transaction_out_index': self.transaction_out_index, 'address': self.address, 'amount': self.amount}
+
+    @property
+    def key(self) -> typing.Tuple[str, int]:
+        return (self.transaction_out_id, self.transaction_out_index)
 
     @staticmethod
     def find_unspent_transaction_out(transaction_id: str, index: int, unspent_transaction_outs):
-        results =  [u for u in unspent_transaction_outs if u.transaction_out_id == transaction_id and u.transaction_out_index == index]
+        return unspent_transaction_outs.find(transaction_id, index)
 
-        if len(results) > 0:
-            return results[0]
-        else:
-            return None
 
+class UnspentTransactionOutSet():
+    """
+    UTXO Set
+     - Unspent transaction outs keyed by (transaction_out_id, transaction_out_index)
+     - Lookup, insert and spend are O(1), so applying a block is linear in its inputs and outputs
+     - The unspent transaction outs of every address are indexed too, so a wallet finds its own without scanning the set
+    """
+    def __init__(self, unspent_transaction_outs: typing.Iterable[UnspentTransactionOut] = ()) -> None:
+        self.unspent_transaction_outs: typing.Dict[typing.Tuple[str, int], UnspentTransactionOut] = {}
+
+        # Per address balance and unspent transaction outs, kept in step with the set
+        self.balances: typing.Dict[str, float] = {}
+        self.addresses: typing.Dict[str, typing.Dict[typing.Tuple[str, int], UnspentTransactionOut]] = {}
+
+        for unspent_transaction_out in unspent_transaction_outs:
+            self.add(unspent_transaction_out)
+
+    def find(self, transaction_out_id: str, transaction_out_index: int) -> typing.Union[UnspentTransactionOut, None]:
+        return self.unspent_transaction_outs.get((transaction_out_id, transaction_out_index))
+
+    def add(self, unspent_transaction_out: UnspentTransactionOut) -> None:
+        # Replacing an existing entry must not count it twice in the balances
+        self.spend(*unspent_transaction_out.key)
+        self.unspent_transaction_outs[unspent_transaction_out.key] = unspent_transaction_out
+
+        address = unspent_transaction_out.address
+        self.balances[address] = self.balances.get(address, 0) + unspent_transaction_out.amount
+        self.addresses.setdefault(address, {})[unspent_transaction_out.key] = unspent_transaction_out
+
+    def spend(self, transaction_out_id: str, transaction_out_index: int) -> typing.Union[UnspentTransactionOut, None]:
+        unspent_transaction_out = self.unspent_transaction_outs.pop((transaction_out_id, transaction_out_index), None)
+
+        if unspent_transaction_out is not None:
+            address = unspent_transaction_out.address
+            address_transaction_outs = self.addresses[address]
+            del address_transaction_outs[unspent_transaction_out.key]
+
+            # Dropping emptied addresses keeps float error from piling up in the balance
+            if len(address_transaction_outs) == 0:
+                del self.addresses[address]
+                del self.balances[address]
+            else:
+                self.balances[address] -= unspent_transaction_out.amount
+
+        return unspent_transaction_out
+
+    def get_balance(self, address: str) -> float:
+        return self.balances.get(address, 0)
+
+    def get_unspent_transaction_outs(self, address: str) -> typing.List[UnspentTransactionOut]:
+        return list(self.addresses.get(address, {}).values())
+
+    def apply_transactions(self, transactions) -> 'UnspentTransactionOutUndo':
+        undo = UnspentTransactionOutUndo()
+
+        for transaction in transactions:
+            for transaction_in in transaction.transaction_ins:
+                spent_transaction_out = self.spend(transaction_in.transaction_out_id, transaction_in.transaction_out_index)
+
+                if spent_transaction_out is not None:
+                    undo.spent_transaction_outs.append(spent_transaction_out)
+
+        for transaction in transactions:
+            transaction_id = transaction.id
+
+            for i, transaction_out in enumerate(transaction.transaction_outs):
+                unspent_transaction_out = UnspentTransactionOut(transaction_id, i, transaction_out.address, transaction_out.amount)
+
+                if unspent_transaction_out.key not in self.unspent_transaction_outs:
+                    undo.created_transaction_outs.append(unspent_transaction_out.key)
+
+                self.add(unspent_transaction_out)
+
+        return undo
+
+    def revert(self, undo: 'UnspentTransactionOutUndo') -> None:
+        for (transaction_out_id, transaction_out_index) in reversed(undo.created_transaction_outs):
+            self.spend(transaction_out_id, transaction_out_index)
+
+        for unspent_transaction_out in undo.spent_transaction_outs:
+            self.add(unspent_transaction_out)
+
+    def serialize(self) -> typing.List[list]:
+        # Compact view for the JSON endpoints and snapshots: [transaction_out_id, transaction_out_index, address, amount]
+        return [[u.transaction_out_id, u.transaction_out_index, u.address, u.amount] for u in self.unspent_transaction_outs.values()]
+
+    @staticmethod
+    def from_list(unspent_transaction_outs_data: typing.List[list]):
+        return UnspentTransactionOutSet([UnspentTransactionOut(*u) for u in unspent_transaction_outs_data])
+
+    def __contains__(self, key: typing.Tuple[str, int]) -> bool:
+        return key in self.unspent_transaction_outs
+
+    def __iter__(self) -> typing.Iterator[UnspentTransactionOut]:
+        return iter(self.unspent_transaction_outs.values())
+
+    def __len__(self) -> int:
+        return len(self.unspent_transaction_outs)
+
+
+class UnspentTransactionOutUndo():
+    """
+    Undo Record
+     - Kept for every applied block so that it can be rolled back without replaying the chain
+     - Holds the transaction outs the block spent and the keys of the ones it created
+    """
+    def __init__(self) -> None:
+        self.spent_transaction_outs: typing.List[UnspentTransactionOut] = []
+        self.created_transaction_outs: typing.List[typing.Tuple[str, int]] = []
+
+    def to_dict(self) -> dict:
+        return {
+            'spent': [[u.transaction_out_id, u.transaction_out_index, u.address, u.amount] for u in self.spent_transaction_outs],
+            'created': [list(key) for key in self.created_transaction_outs]
+        }
+
+    @staticmethod
+    def from_dict(undo_data: dict):
+        undo = UnspentTransactionOutUndo()
+        undo.spent_transaction_outs = [UnspentTransactionOut(*u) for u in undo_data['spent']]
+        undo.created_transaction_outs = [(key[0], key[1]) for key in undo_data['created']]
+
+        return undo
+
+
+class TransactionIn():
+    __slots__ = ('transaction_out_id', 'transaction_out_index', 'signature')
 
-class TransactionIn(dict):
     def __init__(self, transaction_out_id: str, transaction_out_index: int, signature: str) -> None:
         self.transaction_out_id = transaction_out_id
         self.transaction_out_index = transaction_out_index
         self.signature = signature
 
-        dict.__init__(self, transaction_out_id=self.transaction_out_id, transaction_out_index=self.transaction_out_index, signature=self.signature)
+    def to_json(self) -> dict:
+        return {'transaction_out_id': self.transaction_out_id, 'transaction_out_index': self.transaction_out_index, 'signature': self.signature}
 
-    def get_amount(self, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> float:
+    def get_amount(self, unspent_transaction_outs: UnspentTransactionOutSet) -> float:
         unspent_transaction_out = UnspentTransactionOut.find_unspent_transaction_out(self.transaction_out_id, self.transaction_out_index, unspent_transaction_outs)
 
         if unspent_transaction_out is None:
@@ -72,42 +201,102 @@ class TransactionIn(dict):
     def __hash__(self):
         return hash(self.transaction_out_id + str(self.transaction_out_index) + self.signature)
 
+    def encode(self) -> bytes:
+        return encode_string(self.transaction_out_id) + encode_int(self.transaction_out_index) + encode_string(self.signature)
+
     @staticmethod
     def from_dict(transaction_in_data: dict):
         return TransactionIn(transaction_in_data['transaction_out_id'], transaction_in_data['transaction_out_index'], transaction_in_data['signature'])
 
 
-class TransactionOut(dict):
+class TransactionOut():
+    __slots__ = ('address', 'amount')
+
     def __init__(self, address: str, amount: float) -> None:
         self.address = address
         self.amount = amount
 
-        dict.__init__(self, address=self.address, amount=self.amount)
+    def to_json(self) -> dict:
+        return {'address': self.address, 'amount': self.amount}
+
+    def encode(self) -> bytes:
+        return encode_string(self.address) + encode_float(self.amount)
 
     @staticmethod
     def from_dict(transaction_out_data: dict):
         return TransactionOut(transaction_out_data['address'], transaction_out_data['amount'])
 
 
-class Transaction(dict):
+class Transaction():
+    """
+    Transaction
+     - Plain slotted object; to_json gives the dict that the HTTP API and JSON P2P messages send
+    """
+    FIELDS = ('transaction_ins', 'transaction_outs', 'type')
+
+    __slots__ = FIELDS + ('cached_id',)
+
     def __init__(self, transaction_ins: typing.List[TransactionIn], transaction_outs: typing.List[TransactionOut], transaction_type: TransactionTypes = TransactionTypes.TRANSFER) -> None:
             self.transaction_ins = transaction_ins
             self.transaction_outs = transaction_outs
             self.type = transaction_type
 
-            dict.__init__(self, id=self.id, transaction_ins=self.transaction_ins, transaction_outs=self.transaction_outs, type=str(self.type).split('.')[1].lower())
+    def __setattr__(self, name, value):
+        super(Transaction, self).__setattr__(name, value)
+
+        if name in Transaction.FIELDS:
+            self.invalidate()
 
+    def invalidate(self) -> None:
+        """
+        Drop the cached id
+         - Called whenever a field is reassigned, and must be called after changing transaction_ins or transaction_outs in place
+        """
+        super(Transaction, self).__setattr__('cached_id', None)
+
+    def to_json(self) -> dict:
+        return {
+            'id': self.id,
+            'transaction_ins': [transaction_in.to_json() for transaction_in in self.transaction_ins],
+            'transaction_outs': [transaction_out.to_json() for transaction_out in self.transaction_outs],
+            'type': self.type.name.lower()
+        }
 
     @property
     def id(self):
-        ins = ''.join(list(map(lambda i: i.transaction_out_id + str(i.transaction_out_index), self.transaction_ins)))
-        outs = ''.join(list(map(lambda o: o.address + str(o.amount), self.transaction_outs)))
-
-        return hashlib.sha256((ins + outs + str(self.type)).encode()).hexdigest()
+        # The id is hashed once and memoized; its pre-image is kept as is since the genesis signatures sign it
+        if self.cached_id is None:
+            ins = ''.join(list(map(lambda i: i.transaction_out_id + str(i.transaction_out_index), self.transaction_ins)))
+            outs = ''.join(list(map(lambda o: o.address + str(o.amount), self.transaction_outs)))
+
+            super(Transaction, self).__setattr__('cached_id', hashlib.sha256((ins + outs + str(self.type)).encode()).hexdigest())
+
+        return self.cached_id
+
+    def encode(self) -> bytes:
+        """
+        Canonical byte encoding of the transaction, including the signatures that the id does not cover
+        """
+        return b''.join([
+            bytes.fromhex(self.id),
+            encode_string(self.type.value),
+            encode_count(len(self.transaction_ins)),
+            *[transaction_in.encode() for transaction_in in self.transaction_ins],
+            encode_count(len(self.transaction_outs)),
+            *[transaction_out.encode() for transaction_out in self.transaction_outs],
+        ])
+
+
+    def validate(self, unspent_transaction_outs: UnspentTransactionOutSet, signature_jobs: typing.Union[typing.List[SignatureJob], None] = None) -> bool:
+        # Only coinbase transactions create coins, any other transaction has to spend something
+        if len(self.transaction_ins) == 0:
+            return False
 
+        # An out of nothing or less would let the other outs spend more than the ins hold
+        if not all(Transaction.is_positive_amount(transaction_out.amount) for transaction_out in self.transaction_outs):
+            return False
 
-    def validate(self, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> bool:
-        valid_ins = reduce(lambda a, b: a and b, map(lambda i: self.validate_transaction_in(i, unspent_transaction_outs), self.transaction_ins), True)
+        valid_ins = reduce(lambda a, b: a and b, map(lambda i: self.validate_transaction_in(i, unspent_transaction_outs, signature_jobs), self.transaction_ins), True)
         if not valid_ins:
             return False
 
@@ -121,7 +310,17 @@ class Transaction(dict):
 
 
     @staticmethod
-    def validate_transactions_in_block(transactions, unspent_transaction_outs: typing.List[UnspentTransactionOut], block_index: int) -> bool:
+    def is_positive_amount(amount) -> bool:
+        return isinstance(amount, (int, float)) and not isinstance(amount, bool) and math.isfinite(amount) and amount > 0
+
+
+    """
+    Validate Transactions in Block
+     - Signatures are collected while the transactions are checked and verified together by the signature verifier
+     - If signature_jobs is given, the signatures are only added to it, for the caller to verify along with other blocks
+    """
+    @staticmethod
+    def validate_transactions_in_block(transactions, unspent_transaction_outs: UnspentTransactionOutSet, block_index: int, signature_jobs: typing.Union[typing.List[SignatureJob], None] = None) -> bool:
         coinbase_transactions = [t for t in transactions if t.type == TransactionTypes.COINBASE]
         if not len(coinbase_transactions) == 1:
             return False
@@ -132,16 +331,30 @@ class Transaction(dict):
         if not len(set(transaction_ins)) == len(transaction_ins):
             return False
 
-        return reduce(lambda a,b : a and b, map(lambda t: t.validate(unspent_transaction_outs), [t for t in transactions if t.type != TransactionTypes.COINBASE]),True)
+        jobs: typing.List[SignatureJob] = signature_jobs if signature_jobs is not None else []
 
+        if not reduce(lambda a,b : a and b, map(lambda t: t.validate(unspent_transaction_outs, jobs), [t for t in transactions if t.type != TransactionTypes.COINBASE]),True):
+            return False
+
+        if signature_jobs is None:
+            return signature_verifier.verify(jobs)
 
-    def validate_transaction_in(self, transaction_in: TransactionIn, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> bool:
-        referenced_unspent = [u for u in unspent_transaction_outs if u.transaction_out_id == transaction_in.transaction_out_id and u.transaction_out_index == transaction_in.transaction_out_index][0]
+        return True
 
-        key = PublicKey.fromString(referenced_unspent.address)
-        signature = Signature._fromString(transaction_in.signature)
 
-        return Ecdsa.verify(self.id, signature, key)
+    def validate_transaction_in(self, transaction_in: TransactionIn, unspent_transaction_outs: UnspentTransactionOutSet, signature_jobs: typing.Union[typing.List[SignatureJob], None] = None) -> bool:
+        referenced_unspent = unspent_transaction_outs.find(transaction_in.transaction_out_id, transaction_in.transaction_out_index)
+
+        if referenced_unspent is None:
+            return False
+
+        signature_job = (self.id, transaction_in.signature, referenced_unspent.address, referenced_unspent.key)
+
+        if signature_jobs is not None:
+            signature_jobs.append(signature_job)
+            return True
+
+        return signature_verifier.verify([signature_job])
 
 
     """
@@ -158,8 +371,13 @@ class Transaction(dict):
         return Transaction([transaction_in], [transaction_out], TransactionTypes.COINBASE)
 
 
+    """
+    Process Transactions
+     - Validates the transactions of a block against the UTXO set and then applies them to it
+     - The set is updated in place, and is left untouched if the block is invalid
+    """
     @staticmethod
-    def process_transactions(transactions, unspent_transaction_outs: typing.List[UnspentTransactionOut], block_index: int) -> typing.Union[typing.List[UnspentTransactionOut], None]:
+    def process_transactions(transactions, unspent_transaction_outs: UnspentTransactionOutSet, block_index: int) -> typing.Union[UnspentTransactionOutSet, None]:
         if not block_index == GENESIS_BLOCK_INDEX and not Transaction.validate_transactions_in_block(transactions, unspent_transaction_outs, block_index):
             return None
 
@@ -167,11 +385,10 @@ class Transaction(dict):
 
 
     @staticmethod
-    def update_unspent_transaction_outs(transactions, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> typing.List[UnspentTransactionOut]:
-        new_unspent_transaction_outs = reduce(lambda a,b: a + b, map(lambda t: [UnspentTransactionOut(t.id, i, o.address, o.amount) for i, o in enumerate(t.transaction_outs)], transactions), [])
-        consumed_transaction_outs = list(map(lambda i: UnspentTransactionOut(i.transaction_out_id, i.transaction_out_index, '', 0), reduce(lambda a,b: a + b, [t.transaction_ins for t in transactions], [])))
+    def update_unspent_transaction_outs(transactions, unspent_transaction_outs: UnspentTransactionOutSet) -> UnspentTransactionOutSet:
+        unspent_transaction_outs.apply_transactions(transactions)
 
-        return [u for u in unspent_transaction_outs if UnspentTransactionOut.find_unspent_transaction_out(u.transaction_out_id, u.transaction_out_index, consumed_transaction_outs) is None] + new_unspent_transaction_outs
+        return unspent_transaction_outs
 
 
     # Valiate Coinbase Transaction - verifies is TransactionType == COINBASE
@@ -179,14 +396,17 @@ class Transaction(dict):
     def validate_coinbase_transaction(transaction, block_index: int) -> bool:
         return transaction.type == TransactionTypes.COINBASE and len(transaction.transaction_ins) == 1 and len(transaction.transaction_outs) == 1 and transaction.transaction_ins[0].transaction_out_index == block_index and (transaction.transaction_outs[0].amount == COINBASE_AMOUNT or transaction.transaction_outs[0].amount == OWNER_INIT_AMOUNT)
 
+    @staticmethod
+    def from_data(transaction_data) -> 'Transaction':
+        # Transactions received from peers are already decoded when they come in the binary codec, and plain dicts when they come as JSON
+        if isinstance(transaction_data, Transaction):
+            return transaction_data
+
+        return Transaction.from_dict(transaction_data)
+
     @staticmethod
     def from_dict(transaction_data: dict):
-        transaction_ins = []
-        for transaction_in_data in transaction_data['transaction_ins']:
-            transaction_ins.append(TransactionIn.from_dict(transaction_in_data))
-        
-        transaction_outs = []
-        for transaction_out_data in transaction_data['transaction_outs']:
-            transaction_outs.append(TransactionOut.from_dict(transaction_out_data))
-
-        return Transaction(transaction_ins, transaction_outs, TransactionTypes.from_string(transaction_data['type']))
\ No newline at end of file
+        transaction_ins = [TransactionIn.from_dict(transaction_in_data) for transaction_in_data in transaction_data['transaction_ins']]
+        transaction_outs = [TransactionOut.from_dict(transaction_out_data) for transaction_out_data in transaction_data['transaction_outs']]
+
+        return Transaction(transaction_ins, transaction_outs, TransactionTypes.from_string(transaction_data['type']))
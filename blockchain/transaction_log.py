@@ -0,0 +1,63 @@
+import typing
+
+from blockchain.transaction import Transaction
+
+class TransactionLog():
+    """
+    Transaction Log
+     - Append only log of every transaction in the chain, in chain order
+     - Blocks are appended as they are added to the chain and truncated when they are rolled back
+     - Transactions can be looked up by id through the (block index, position) index
+    """
+    def __init__(self) -> None:
+        self.transactions: typing.List[Transaction] = []
+
+        # Offset of the first transaction of every block in the log
+        self.block_offsets: typing.List[int] = []
+        self.block_indexes: typing.List[int] = []
+
+        self.locations: typing.Dict[str, typing.Tuple[int, int]] = {}
+
+    def append_block(self, block) -> None:
+        self.block_offsets.append(len(self.transactions))
+        self.block_indexes.append(block.index)
+
+        for position, transaction in enumerate(block.transactions):
+            self.transactions.append(transaction)
+            self.locations[transaction.id] = (block.index, position)
+
+    def remove_last_block(self) -> None:
+        offset = self.block_offsets.pop()
+        block_index = self.block_indexes.pop()
+
+        for transaction in self.transactions[offset:]:
+            if self.locations.get(transaction.id, (None, None))[0] == block_index:
+                del self.locations[transaction.id]
+
+        del self.transactions[offset:]
+
+    def get_location(self, transaction_id: str) -> typing.Union[typing.Tuple[int, int], None]:
+        return self.locations.get(transaction_id)
+
+    def find(self, transaction_id: str) -> typing.Union[Transaction, None]:
+        location = self.locations.get(transaction_id)
+
+        if location is None:
+            return None
+
+        # Block indexes in the chain are consecutive, so the block is found by its distance from the first one
+        (block_index, position) = location
+        return self.transactions[self.block_offsets[block_index - self.block_indexes[0]] + position]
+
+    def iter_transactions(self, start: int = 0) -> typing.Iterator[Transaction]:
+        for i in range(start, len(self.transactions)):
+            yield self.transactions[i]
+
+    def __iter__(self) -> typing.Iterator[Transaction]:
+        return self.iter_transactions()
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __getitem__(self, i):
+        return self.transactions[i]
@@ -0,0 +1,143 @@
+import typing
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+
+from ellipticcurve.ecdsa import Ecdsa
+from ellipticcurve.signature import Signature
+from ellipticcurve.publicKey import PublicKey
+
+from blockchain.constants import PARALLEL_VERIFICATION_THRESHOLD, SIGNATURE_CACHE_SIZE, VERIFICATION_CHUNK_SIZE
+
+# (message, signature, public key, transaction in key), with the signature and the public key as hex strings
+# The transaction in key is the (transaction_out_id, transaction_out_index) the signature unlocks
+SignatureJob = typing.Tuple[str, str, str, typing.Tuple[str, int]]
+
+
+def verify_signature(message: str, signature: str, public_key: str) -> bool:
+    try:
+        return Ecdsa.verify(message, Signature._fromString(signature), PublicKey.fromString(public_key))
+
+    except Exception:
+        return False
+
+
+def verify_signatures(jobs: typing.List[SignatureJob]) -> bool:
+    for (message, signature, public_key, _) in jobs:
+        if not verify_signature(message, signature, public_key):
+            return False
+
+    return True
+
+
+class SignatureCache():
+    """
+    Signature Cache
+     - Bounded LRU of successfully verified signatures, keyed by (transaction id, transaction in key, public key)
+     - A lookup only hits if the cached signature is the one being checked
+     - Shared by transaction validation and the wallet, so each signature is paid for once per node lifetime
+    """
+    def __init__(self, max_size: int = SIGNATURE_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.entries: typing.OrderedDict[tuple, str] = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def contains(self, job: SignatureJob) -> bool:
+        (message, signature, public_key, transaction_in_key) = job
+        key = (message, transaction_in_key, public_key)
+
+        with self.lock:
+            if self.entries.get(key) == signature:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            return False
+
+    def add(self, job: SignatureJob) -> None:
+        (message, signature, public_key, transaction_in_key) = job
+        key = (message, transaction_in_key, public_key)
+
+        with self.lock:
+            self.entries[key] = signature
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'max_size': self.max_size
+            }
+
+
+class SignatureVerifier():
+    """
+    Signature Verifier
+     - Verifies the signatures collected from a block or a chain segment in one go
+     - Large batches are split into chunks and checked across a ProcessPoolExecutor, once start has created it; until then
+       every batch is checked in this process
+     - The worker processes are started with forkserver (spawn where it is not available) rather than fork, since forking a
+       process whose other threads may hold locks, such as the chain's, can leave the workers deadlocked
+     - Fails fast: pending chunks are cancelled as soon as one of them has a bad signature
+     - Signatures found in the cache are skipped, and the rest are added to it once the whole batch is valid
+    """
+    def __init__(self, cache: SignatureCache, max_workers: typing.Union[int, None] = None) -> None:
+        self.cache = cache
+
+        self.max_workers = max_workers
+        self.executor: typing.Union[concurrent.futures.ProcessPoolExecutor, None] = None
+
+    def verify(self, jobs: typing.List[SignatureJob]) -> bool:
+        jobs = [job for job in jobs if not self.cache.contains(job)]
+
+        if not self.verify_uncached(jobs):
+            return False
+
+        for job in jobs:
+            self.cache.add(job)
+
+        return True
+
+    def start(self) -> None:
+        if self.executor is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(start_method))
+
+    def verify_uncached(self, jobs: typing.List[SignatureJob]) -> bool:
+        if len(jobs) < PARALLEL_VERIFICATION_THRESHOLD or self.executor is None:
+            return verify_signatures(jobs)
+
+        futures = [self.executor.submit(verify_signatures, jobs[i:i + VERIFICATION_CHUNK_SIZE]) for i in range(0, len(jobs), VERIFICATION_CHUNK_SIZE)]
+
+        for future in concurrent.futures.as_completed(futures):
+            if not future.result():
+                for pending in futures:
+                    pending.cancel()
+
+                return False
+
+        return True
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+signature_cache = SignatureCache()
+signature_verifier = SignatureVerifier(signature_cache)
@@ -1,24 +1,49 @@
+import os
 import time
+import typing
+import queue
 import signal
+import threading
 import urllib.parse
 import requests
 
 from uuid import uuid4
-from flask import Flask, json, jsonify, request, send_from_directory
+from flask import Flask, Response, json, jsonify, request, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.serving import make_server
 from blockchain.transaction import Transaction, TransactionTypes
 
 from p2p.node import P2PNode
+from p2p.transports import TRANSPORT_THREADED, TRANSPORTS
 from p2p.events import P2PEvents
 
 from blockchain.block import Block
 from blockchain.blockchain import Blockchain
-from blockchain.constants import VALIDATOR_AMOUNT, CHAIN_ADDRESS
+from blockchain.codec import decode_message, is_message
+from blockchain.minter import Minter
+from blockchain.store import BlockStore
+from blockchain.sync import ChainSync
+from blockchain.events import event_stream
+from blockchain.gossip import Gossip
+from blockchain.constants import DEFAULT_PAGE_SIZE, GENESIS_BLOCK_INDEX, MAX_PAGE_SIZE, VALIDATOR_AMOUNT, CHAIN_ADDRESS
+from blockchain.verification import signature_cache, signature_verifier
 
 from wallet.wallet import Wallet
 
+class JSONProvider(DefaultJSONProvider):
+    # Blocks, transactions and unspent transaction outs are not dicts, they are serialized through their to_json
+    @staticmethod
+    def default(o):
+        if hasattr(o, 'to_json'):
+            return o.to_json()
+
+        return DefaultJSONProvider.default(o)
+
+
 # Instantiate the Node
 app = Flask(__name__)
+app.json = JSONProvider(app)
 
 # Handle CORS
 CORS(app)
@@ -34,79 +59,184 @@ wallet = Wallet()
 # Instantiate the Blockchain
 blockchain = Blockchain()
 
-class ExitFromApp(Exception):
-    pass
+def handle_chain_updated():
+    # A competing block arrived, so the running minting attempt is abandoned, and the new tip is passed on to the other nodes
+    minter.cancel()
+
+    with blockchain.lock.read():
+        last_block = blockchain.last_block
+
+    gossip.announce_block(last_block)
+
+# Instantiate the Chain Sync, which exchanges blocks with the other nodes
+sync = ChainSync(blockchain, p2pNode, handle_chain_updated)
+
+def handle_block_minted(block):
+    gossip.announce_block(block)
+
+# Instantiate the Minter, which mints blocks in the background
+minter = Minter(blockchain, wallet, handle_block_minted)
+
+# Instantiate the Gossip, which spreads new transactions and blocks through the network
+gossip = Gossip(blockchain, sync)
 
-def handle_p2p_events(event, data):
+# Set by SIGINT / SIGTERM; the main thread waits on it and then shuts the node down
+shutdown_event = threading.Event()
+
+def handle_p2p_events(event, data, connection = None):
     if event == P2PEvents.CONNECTED:
         print('Connected with: ', data)
+        event_stream.publish('nodes', p2pNode.connection_urls)
+    elif event == P2PEvents.DISCONNECTED:
+        event_stream.publish('nodes', p2pNode.connection_urls)
     elif event == P2PEvents.MESSAGE_RECEIVED:
+        if is_message(data):
+            data = decode_message(data)
+
         if data['event'] == 'register_node' and data['host'] and data['port']:
             p2pNode.connect(host=data['host'], port=data['port'])
-        elif data['event'] == 'new_transaction':
-            blockchain.transaction_pool.append(Transaction.from_dict(data['transaction']))
-        elif data['event'] == 'init_chain':
-            blockchain.replace_chain(data['chain'])
         elif data['event'] == 'init_pool':
             blockchain.replace_pool(data['pool'])
-        elif data['event'] == 'block_created':
-            blockchain.block_mining = True
+        elif data['event'] in ChainSync.EVENTS:
+            sync.handle_message(data, connection)
+        elif data['event'] in Gossip.EVENTS:
+            gossip.handle_message(data, connection)
 
-            if blockchain.replace_chain(data['chain']):
-                blockchain.transaction_pool = []
 
-            blockchain.block_mining = False
+def shutdown(signal, frame):
+    shutdown_event.set()
 
 
-def shutdown(signal, frame):
-    raise ExitFromApp
+def create_server(server: str, host: str, port: int, threads: int):
+    """
+    HTTP server for the app, returned as its (serve, close) functions
+     - development: the Werkzeug development server, with a thread per request
+     - waitress: the waitress production server, with a pool of threads request handlers run on
+     - Either way the server runs in this process, so every request shares the one Blockchain, Wallet and P2P node
+    """
+    if server == 'waitress':
+        try:
+            import waitress
+        except ImportError:
+            raise SystemExit('--server=waitress needs waitress installed: pip3 install waitress')
+
+        http_server = waitress.create_server(app, host=host, port=port, threads=threads)
+        return http_server.run, http_server.close
+
+    http_server = make_server(host, port, app, threaded=True)
+    return http_server.serve_forever, http_server.shutdown
+
+
+# Seconds between the heartbeats sent to idle /events clients
+EVENT_HEARTBEAT_INTERVAL = 15
+
+
+def get_page_limit() -> int:
+    return max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+
+def get_amount(value) -> typing.Union[float, None]:
+    # Amounts are numbers or numeric strings, as float() takes them, and have to be a positive number of coins
+    if isinstance(value, bool):
+        return None
+
+    try:
+        amount = float(value)
+
+    except (TypeError, ValueError):
+        return None
+
+    return amount if Transaction.is_positive_amount(amount) else None
 
 
 """
     Chain
     - This endpoint returns the whole full blockchain
     - All the blocks with transactions and the length of blockchain is returned as json
+    - The response is streamed a block at a time, so the whole chain is never serialized in memory at once
 """
 @app.route('/chain', methods=['GET'])
 def full_chain():
+    # Blocks added while the response is streamed are left out
+    with blockchain.lock.read():
+        chain = list(blockchain.chain)
+
+    def generate():
+        yield '{"chain": ['
+
+        for i, block in enumerate(chain):
+            yield (',' if i > 0 else '') + app.json.dumps(block)
+
+        yield '], "length": ' + str(len(chain)) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json'), 200
+
+
+"""
+    Blocks
+    - This endpoint returns a page of the chain
+    - from is the index of the first block (defaults to the genesis block), limit the number of blocks (at most MAX_PAGE_SIZE)
+    - next is the index to ask for the following page, or null on the last page
+"""
+@app.route('/blocks', methods=['GET'])
+def get_blocks():
+    from_index = max(request.args.get('from', GENESIS_BLOCK_INDEX, type=int), GENESIS_BLOCK_INDEX)
+
+    with blockchain.lock.read():
+        blocks = blockchain.get_blocks(from_index, get_page_limit())
+        (length, last_index) = (len(blockchain.chain), blockchain.last_block.index)
+
+    next_index = from_index + len(blocks)
+
     response = {
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain),
+        'blocks': [dict(block.to_json(), hash=block.hash()) for block in blocks],
+        'length': length,
+        'next': next_index if next_index <= last_index else None,
     }
     return jsonify(response), 200
 
 
+"""
+    Block
+    - This endpoint returns the block with the given hash
+"""
+@app.route('/blocks/<block_hash>', methods=['GET'])
+def get_block(block_hash):
+    block = blockchain.get_block(block_hash)
+
+    if block is None:
+        return jsonify('Block not found'), 404
+
+    return jsonify(dict(block.to_json(), hash=block.hash())), 200
+
+
 """
     Mint
     - The requirements a node has to fulfil to mint nodes is:
         - It must be a validator
         - It must stake some coints before minting
     - If any of the requirements fail to occur, the minting process is not taken forward
-    - Once the requirements are fulfiled, consensus algorithms is run, block is created and appended to the chain
+    - Once the requirements are fulfiled, the minter runs the consensus algorithm in the background
+    - The block is appended to the chain and broadcast once the node's stake is selected for a timestamp slot
 """
 @app.route('/mint', methods=['GET'])
 def mine():
+    with blockchain.lock.read():
+        (is_validator, stake) = (wallet.can_account_validate(blockchain.accounts), wallet.get_account_stake(blockchain.accounts))
+
     # Checking whether the node is a validator or not
-    if not wallet.can_account_validate(blockchain.all_transactions):
+    if not is_validator:
         return jsonify('You need to be a validator to mint blocks'), 400
 
     # Checking whether any coins are staked by the node or not
-    if wallet.get_account_stake(blockchain.all_transactions) == 0:
+    if stake == 0:
         return jsonify('You need to stake some coins in order to mint blocks'), 400
 
-    # Creating and minting the block
-    new_block = blockchain.create_new_block(wallet)
+    # Starting the minter, unless an attempt is already running
+    if not minter.start():
+        return jsonify('Minting is already in progress'), 200
 
-    # If another minting node finishes the minting process None is returned from the earlier function
-    if new_block is None:
-        return jsonify('Another node completed mining before this node'), 200
-
-    p2pNode.broadcast({
-        'event': 'block_created',
-        'chain': blockchain.chain
-    })
-
-    return jsonify('Minting Completed!'), 200
+    return jsonify('Minting started, the block will be added once your stake is selected'), 202
 
 
 """
@@ -115,7 +245,8 @@ def mine():
 """
 @app.route('/wallet/balance', methods=['GET'])
 def get_balance():
-    return jsonify(wallet.get_account_balance(blockchain.unspent_transaction_outs)), 200
+    with blockchain.lock.read():
+        return jsonify(wallet.get_account_balance(blockchain.unspent_transaction_outs)), 200
 
 
 """
@@ -124,7 +255,8 @@ def get_balance():
 """
 @app.route('/wallet/stake', methods=['GET'])
 def get_stake():
-    return jsonify(wallet.get_account_stake(blockchain.all_transactions)), 200
+    with blockchain.lock.read():
+        return jsonify(wallet.get_account_stake(blockchain.accounts)), 200
 
 
 """
@@ -133,7 +265,7 @@ def get_stake():
 """
 @app.route('/wallet/address', methods=['GET'])
 def get_address():
-    return wallet.public_key.toString(), 200
+    return wallet.address, 200
 
 
 """
@@ -142,7 +274,8 @@ def get_address():
 """
 @app.route('/wallet/validator', methods=['GET'])
 def is_validator():
-    return jsonify(wallet.can_account_validate(blockchain.all_transactions)), 200
+    with blockchain.lock.read():
+        return jsonify(wallet.can_account_validate(blockchain.accounts)), 200
 
 
 """
@@ -154,10 +287,12 @@ def is_validator():
 """
 @app.route('/wallet', methods=["GET"])
 def wallet_details():
-    balance = wallet.get_account_balance(blockchain.unspent_transaction_outs)
-    stake = wallet.get_account_stake(blockchain.all_transactions)
-    address = wallet.public_key.toString(), 200
-    is_validator = wallet.can_account_validate(blockchain.all_transactions)
+    with blockchain.lock.read():
+        balance = wallet.get_account_balance(blockchain.unspent_transaction_outs)
+        stake = wallet.get_account_stake(blockchain.accounts)
+        is_validator = wallet.can_account_validate(blockchain.accounts)
+
+    address = wallet.address, 200
 
     data = {
         'balance': balance,
@@ -190,23 +325,63 @@ def create_new_transaction():
     if not all(k in values for k in required):
         return 'Missing values', 400
 
-    # Create a new Transaction
-    transaction = wallet.create_transaction(values['recipient'], float(values['amount']), blockchain.unspent_transaction_outs, blockchain.transaction_pool)
+    # Create a new Transaction, selecting coins from and validating it against the same state of the chain
+    with blockchain.lock.read():
+        transaction = wallet.create_transaction(values['recipient'], float(values['amount']), blockchain.unspent_transaction_outs, blockchain.transaction_pool)
+        added = transaction is not None and blockchain.add_transaction(transaction)
 
     # If transaction creation is successful, the transaction would be appended to the pool
-    if transaction is not None:
-        blockchain.transaction_pool.append(transaction)
-
-        p2pNode.broadcast({
-            'event': 'new_transaction',
-            'transaction': transaction
-        })
+    if added:
+        gossip.add_transaction(transaction)
 
         return jsonify({'message': 'Added your transaction to pool'}), 200
     else:
         return jsonify({'message': 'Could not add your transaction'}), 401
 
 
+"""
+    Create a batch of payments
+    - This is a POST Endpoint to pay several recipients at once
+    - The request body contains a list of payments, each with
+        - Recipient - address of the wallet of recipient
+        - Amount - number of coins that are need to be transferred, a positive number or a string of one
+    - All the payments go into a single transaction, so coins are selected and signed once for the whole batch
+"""
+@app.route('/transactions/batch', methods=['POST'])
+def create_batch_transaction():
+    values = request.get_json()
+
+    # Validating the values from request body
+    if values is None:
+        return None, 401
+
+    payments = values.get('payments')
+    if not isinstance(payments, list) or len(payments) == 0:
+        return 'Missing values', 400
+
+    # Validating the required parameters of every payment
+    required = ['recipient', 'amount']
+    if not all(isinstance(payment, dict) and all(k in payment for k in required) for payment in payments):
+        return 'Missing values', 400
+
+    # Every amount has to be a positive number of coins
+    amounts = [get_amount(payment['amount']) for payment in payments]
+    if None in amounts:
+        return 'Amounts have to be positive numbers', 400
+
+    # Coins are selected from, and the transaction validated against, the same state of the chain
+    with blockchain.lock.read():
+        transaction = wallet.create_batch_transaction([(payment['recipient'], amount) for (payment, amount) in zip(payments, amounts)], blockchain.unspent_transaction_outs, blockchain.transaction_pool)
+        added = transaction is not None and blockchain.add_transaction(transaction)
+
+    if added:
+        gossip.add_transaction(transaction)
+
+        return jsonify({'message': 'Added your transaction to pool', 'id': transaction.id}), 200
+    else:
+        return jsonify({'message': 'Could not add your transaction'}), 401
+
+
 """
     Create a new validator transaction
     - This transaction makes the user a Validator
@@ -217,17 +392,18 @@ def create_new_transaction():
 @app.route('/transactions/validator', methods=['POST'])
 def become_a_validator():
     # Verify if the user is already a validator
-    if wallet.can_account_validate(blockchain.all_transactions):
-        return jsonify('you are already a validator'), 200
+    with blockchain.lock.read():
+        is_validator = wallet.can_account_validate(blockchain.accounts)
 
-    transaction = wallet.create_transaction(CHAIN_ADDRESS, VALIDATOR_AMOUNT, blockchain.unspent_transaction_outs, blockchain.transaction_pool, TransactionTypes.VALIDATOR)
-    if transaction is not None:
-        blockchain.transaction_pool.append(transaction)
+    if is_validator:
+        return jsonify('you are already a validator'), 200
 
-        p2pNode.broadcast({
-            'event': 'new_transaction',
-            'transaction': transaction
-        })
+    # Coins are selected from, and the transaction validated against, the same state of the chain
+    with blockchain.lock.read():
+        transaction = wallet.create_transaction(CHAIN_ADDRESS, VALIDATOR_AMOUNT, blockchain.unspent_transaction_outs, blockchain.transaction_pool, TransactionTypes.VALIDATOR)
+        added = transaction is not None and blockchain.add_transaction(transaction)
+    if added:
+        gossip.add_transaction(transaction)
 
         return jsonify('Added your transaction to pool'), 200
 
@@ -255,16 +431,14 @@ def stake_coins():
     if not all(k in values for k in required):
         return jsonify('Missing values'), 400
 
-    transaction = wallet.create_transaction(CHAIN_ADDRESS, float(values['amount']), blockchain.unspent_transaction_outs, blockchain.transaction_pool, TransactionTypes.STAKE)
+    # Coins are selected from, and the transaction validated against, the same state of the chain
+    with blockchain.lock.read():
+        transaction = wallet.create_transaction(CHAIN_ADDRESS, float(values['amount']), blockchain.unspent_transaction_outs, blockchain.transaction_pool, TransactionTypes.STAKE)
+        added = transaction is not None and blockchain.add_transaction(transaction)
 
     # If transaction creation is successful, the transaction would be appended to the pool
-    if transaction is not None:
-        blockchain.transaction_pool.append(transaction)
-
-        p2pNode.broadcast({
-            'event': 'new_transaction',
-            'transaction': transaction
-        })
+    if added:
+        gossip.add_transaction(transaction)
 
         return jsonify('Added your transaction to pool'), 200
     else:
@@ -276,13 +450,64 @@ def stake_coins():
 """
     Get Transactions Pool
     - This endpoint returns all the transactions currently in the pool
-    - Once the block is minted, the transaction pool is emptied and this endpoint then returns an empty array
+    - Transactions are validated when they enter the pool, and ones spending coins another pooled transaction spends are rejected
+    - Once a block is added to the chain, the transactions it includes are removed from the pool
 """
 @app.route('/transactions/pool', methods=['GET'])
 def unverified_transactions():
     return jsonify(blockchain.transaction_pool), 200
 
 
+"""
+    Verified Transactions
+    - This endpoint returns a page of the transactions in the chain, in chain order
+    - from is the position of the first transaction (defaults to 0), limit the number of transactions (at most MAX_PAGE_SIZE)
+    - next is the position to ask for the following page, or null on the last page
+"""
+@app.route('/transactions', methods=['GET'])
+def verified_transactions():
+    start = max(request.args.get('from', 0, type=int), 0)
+
+    with blockchain.lock.read():
+        transactions = blockchain.get_transactions(start, get_page_limit())
+        length = len(blockchain.transaction_log)
+
+    next_start = start + len(transactions)
+
+    response = {
+        'transactions': transactions,
+        'length': length,
+        'next': next_start if next_start < length else None,
+    }
+    return jsonify(response), 200
+
+
+"""
+    Transaction
+    - This endpoint returns the transaction with the given id, from the chain or from the pool
+    - block_index is the index of the block that includes it, or null while it is in the pool
+"""
+@app.route('/transactions/<transaction_id>', methods=['GET'])
+def get_transaction(transaction_id):
+    with blockchain.lock.read():
+        location = blockchain.transaction_log.get_location(transaction_id)
+        transaction = blockchain.find_transaction(transaction_id)
+
+    if location is not None:
+        response = {
+            'transaction': transaction,
+            'block_index': location[0],
+        }
+        return jsonify(response), 200
+
+    transaction = blockchain.transaction_pool.get(transaction_id)
+
+    if transaction is not None:
+        return jsonify({'transaction': transaction, 'block_index': None}), 200
+
+    return jsonify('Transaction not found'), 404
+
+
 """
     Get Nodes
     - This endpoint returns all the nodes connected to the blockchain
@@ -343,10 +568,15 @@ def broadcast_node():
 
     connected_node = p2pNode.get_connection(host, port)
 
-    p2pNode.send_to_node(connected_node, {
-        'event': 'init_chain',
-        'chain': blockchain.chain
-    })
+    # Without a connection the announcement below would go to every peer
+    if connected_node is None:
+        return jsonify('Could not connect to ' + P2PNode.to_url(host, port)), 502
+
+    # The new node asks for the blocks it is missing once it sees our tip
+    with blockchain.lock.read():
+        last_block = blockchain.last_block
+
+    sync.announce_block(last_block, connected_node)
     p2pNode.send_to_node(connected_node, {
         'event': 'init_pool',
         'pool': blockchain.transaction_pool
@@ -355,6 +585,82 @@ def broadcast_node():
     return jsonify(nodes_list), 200
 
 
+"""
+    Events
+    - This endpoint streams live updates as Server-Sent Events, so the web UI does not have to poll
+    - block / block_removed: header of a block added to or rolled back from the chain
+    - pool_add / pool_remove: transaction added to the pool, id of a transaction removed from it
+    - wallet: balance, stake and validator status of the wallet, sent on connect and whenever a block changes them
+    - nodes: urls of the connected nodes
+    - resync: the client fell behind and has to fetch the current state again
+"""
+@app.route('/events', methods=['GET'])
+def events():
+    subscription = event_stream.subscribe()
+
+    def format_event(event, data) -> str:
+        return 'event: ' + event + '\ndata: ' + app.json.dumps(data) + '\n\n'
+
+    def get_wallet_state() -> dict:
+        with blockchain.lock.read():
+            return {
+                'balance': wallet.get_account_balance(blockchain.unspent_transaction_outs),
+                'stake': wallet.get_account_stake(blockchain.accounts),
+                'is_validator': wallet.can_account_validate(blockchain.accounts)
+            }
+
+    def generate():
+        wallet_state = get_wallet_state()
+
+        try:
+            yield format_event('wallet', wallet_state)
+
+            while True:
+                try:
+                    (event, data) = subscription.get(timeout=EVENT_HEARTBEAT_INTERVAL)
+
+                except queue.Empty:
+                    # Comments keep idle connections from being closed by proxies
+                    yield ': heartbeat\n\n'
+                    continue
+
+                yield format_event(event, data)
+
+                if event in ('block', 'block_removed', 'resync'):
+                    new_wallet_state = get_wallet_state()
+
+                    if new_wallet_state != wallet_state:
+                        wallet_state = new_wallet_state
+                        yield format_event('wallet', wallet_state)
+
+        finally:
+            event_stream.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+"""
+    Stats
+    - This endpoint returns runtime counters of the node
+    - Hits and misses of the signature verification cache
+    - Size of the mempool and the number of transactions evicted from it
+    - Contention on the chain lock: acquisitions, how many had to wait and for how long, and how long blocks held the write lock
+    - Gossip: message ids remembered and awaited, and how many of the transactions received had been seen before
+    - Peers: the send queue of every connection, how many messages wait in it, were sent, dropped or coalesced, and how long they waited
+"""
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    response = {
+        'signature_cache': signature_cache.stats(),
+        'mempool': blockchain.transaction_pool.stats(),
+        'chain_lock': blockchain.lock.stats(),
+        'gossip': gossip.stats(),
+        'peers': p2pNode.connection_stats(),
+    }
+
+    return jsonify(response), 200
+
+
 @app.route('/', methods=['GET'])
 def base():
 	return send_from_directory('web/public', 'index.html')
@@ -379,6 +685,10 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--socket', default=4001, type=int, help='p2p socket port to listen on')
     parser.add_argument('-o', '--owner', default=False, action='store_true')
     parser.add_argument('-k', '--wallet-key', help='Initialize the wallet with your private key')
+    parser.add_argument('-t', '--transport', default=TRANSPORT_THREADED, choices=sorted(TRANSPORTS), help='p2p transport, a thread per connection or a single asyncio event loop')
+    parser.add_argument('-d', '--data-dir', default='data', help='directory the chain is stored in, one database per socket port')
+    parser.add_argument('--server', default='development', choices=['development', 'waitress'], help='HTTP server, the Flask development server or the waitress production server')
+    parser.add_argument('--threads', default=16, type=int, help='request handler threads of the waitress server; every open /events stream holds one')
 
     args = parser.parse_args()
 
@@ -391,18 +701,39 @@ if __name__ == '__main__':
     if args.wallet_key:
         wallet.set_private_key(args.wallet_key)
 
+    if args.transport != TRANSPORT_THREADED:
+        p2pNode = TRANSPORTS[args.transport]()
+        sync.node = p2pNode
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    blockchain.load(BlockStore(os.path.join(args.data_dir, 'chain-' + str(socket_port) + '.db')))
+
+    (serve, close_server) = create_server(args.server, '0.0.0.0', port, args.threads)
+
+    # Created at startup, rather than by the first large batch of signatures, which is verified under the chain's write lock
+    signature_verifier.start()
+
     signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
 
-    try:
-        p2pNode.init(host='0.0.0.0', port=socket_port, callback=handle_p2p_events)
-        p2pNode.start()
+    p2pNode.init(host='0.0.0.0', port=socket_port, callback=handle_p2p_events)
+    p2pNode.start()
+
+    gossip.start()
+
+    # The HTTP server runs on its own thread, leaving the main thread free to handle signals
+    threading.Thread(target=serve, daemon=True).start()
+
+    shutdown_event.wait()
+
+    close_server()
+    minter.cancel()
+    gossip.stop()
 
-        app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
+    p2pNode.stop()
+    p2pNode.join()
 
-        while True:
-            continue
+    signature_verifier.shutdown()
 
-    except ExitFromApp:
-        if p2pNode is not None:
-            p2pNode.terminate_flag.set()
-            p2pNode.join()
\ No newline at end of file
+    if blockchain.store is not None:
+        blockchain.store.close()
@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import typing
+
+from concurrent.futures import ThreadPoolExecutor
+
+from p2p.connection import P2PConnection
+from p2p.constants import MESSAGE_ENCODING, END_OF_MESSAGE, MAX_MESSAGE_SIZE
+from p2p.framing import FRAME_HEADER, FRAMING_DELIMITED, FRAMING_LENGTH, FrameTooLarge
+from p2p.events import P2PEvents
+from p2p.node import P2PNode
+from p2p.send_queue import SendQueue
+
+class AsyncP2PConnection():
+    """
+    asyncio counterpart of P2PConnection
+     - The reader waits on the stream for the next message instead of polling the socket
+     - send can be called from any thread; the message is put in the connection's send queue, which a writer task drains,
+       waiting for the peer to take each message before writing the next, so a slow peer only fills its own queue
+    """
+    def __init__(self, node: 'AsyncP2PNode', reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, port: int, original_host: str = None, original_port: int = None, framing: str = FRAMING_DELIMITED) -> None:
+        self.node = node
+
+        self.host = host
+        self.port = port
+
+        self.original_host = original_host
+        self.original_port = original_port
+
+        self.reader = reader
+        self.writer = writer
+
+        self.framing = framing
+
+        self.send_queue = SendQueue()
+        self.send_event = asyncio.Event()
+
+    def send(self, data, key: str = None):
+        if self.writer.is_closing():
+            return
+
+        message = P2PConnection.encode_message(data, self.framing)
+
+        if message is None:
+            return
+
+        if not self.send_queue.put(message, key):
+            print('send queue full, disconnecting', self.host, self.port)
+            self.stop()
+            return
+
+        self.node.loop.call_soon_threadsafe(self.send_event.set)
+
+    async def write_queued(self) -> None:
+        while not self.writer.is_closing():
+            # Cleared before looking at the queue, so a message queued in between still wakes the writer
+            self.send_event.clear()
+            queued = self.send_queue.get()
+
+            if queued is None:
+                await self.send_event.wait()
+                continue
+
+            (message, enqueued_at) = queued
+
+            try:
+                self.writer.write(message)
+                await self.writer.drain()
+
+            except ConnectionError:
+                # The reader notices the closed connection and cleans it up
+                return
+
+            self.send_queue.record_sent(enqueued_at)
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.is_closing()
+
+    def stop(self):
+        # Aborted rather than closed, which would wait for a peer that stopped reading to take the buffered data first
+        self.node.loop.call_soon_threadsafe(self.writer.transport.abort)
+
+    async def read_packet(self) -> bytes:
+        if self.framing == FRAMING_LENGTH:
+            length = FRAME_HEADER.unpack(await self.reader.readexactly(FRAME_HEADER.size))[0]
+
+            if length > MAX_MESSAGE_SIZE:
+                raise FrameTooLarge(length)
+
+            return await self.reader.readexactly(length)
+
+        return (await self.reader.readuntil(END_OF_MESSAGE))[:-1]
+
+    async def run(self):
+        writer_task = asyncio.create_task(self.write_queued())
+
+        try:
+            while True:
+                packet = await self.read_packet()
+
+                if len(packet) > 0:
+                    self.node.dispatch(P2PEvents.MESSAGE_RECEIVED, P2PConnection.parse_packet(packet), self)
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, FrameTooLarge):
+            pass
+
+        finally:
+            writer_task.cancel()
+            self.writer.close()
+
+            if self in self.node.connections:
+                self.node.connections.remove(self)
+                self.node.dispatch(P2PEvents.DISCONNECTED, (self.host, self.port))
+
+
+class AsyncP2PNode(P2PNode):
+    """
+    asyncio P2P transport
+     - Same broadcast / send_to_node / connect / callback API as P2PNode, and the same handshake, so both transports can be mixed in a network
+     - All connections are served by one event loop running on the node's thread
+     - Callbacks run in order on a separate worker thread, so slow handlers never hold up the event loop
+    """
+    def __init__(self) -> None:
+        threading.Thread.__init__(self)
+
+        self.host = '0.0.0.0'
+        self.port = 0
+
+        self.terminate_flag = threading.Event()
+
+        self.connections: typing.List[AsyncP2PConnection] = []
+
+        self.loop: typing.Union[asyncio.AbstractEventLoop, None] = None
+        self.tasks: typing.Set[asyncio.Task] = set()
+        self.stopped: typing.Union[asyncio.Event, None] = None
+        self.started = threading.Event()
+
+        self.callback_executor = ThreadPoolExecutor(max_workers=1)
+
+        self.messages_sent = 0
+        self.messages_recv = 0
+        self.messages_rerr = 0
+
+        self.event_handler = self.handler
+
+    def init(self, host: str, port: int, callback: typing.Callable[..., None] = None) -> None:
+        self.host = host
+        self.port = port
+
+        self.event_handler = callback if callback is not None else self.handler
+
+    def start(self):
+        super(AsyncP2PNode, self).start()
+        self.started.wait()
+
+    def dispatch(self, event: P2PEvents, data, connection: AsyncP2PConnection = None) -> None:
+        if connection is None:
+            self.callback_executor.submit(self.event_handler, event, data)
+        else:
+            self.callback_executor.submit(self.event_handler, event, data, connection)
+
+    def connect(self, host: str, port: int) -> bool:
+        if host == '0.0.0.0':
+            host = 'localhost'
+
+        if host == self.host and port == self.port:
+            return False
+
+        if self.get_connection(host, port) is not None:
+            return True
+
+        future = asyncio.run_coroutine_threadsafe(self.open_connection(host, port), self.loop)
+
+        # Blocking on the result from the event loop's own thread would deadlock it
+        if threading.current_thread() is self:
+            return True
+
+        try:
+            return future.result()
+
+        except Exception as e:
+            print('could not connect', e)
+            return False
+
+    async def open_connection(self, host: str, port: int) -> bool:
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_SIZE)
+
+        writer.write(P2PNode.to_handshake(self.host, self.port, FRAMING_LENGTH))
+        await writer.drain()
+
+        # Messages sent right after the handshake stay in the reader's buffer for the connection
+        try:
+            (connection_host, connection_port, framing) = P2PNode.from_handshake(await AsyncP2PNode.read_handshake(reader))
+
+        except Exception:
+            writer.close()
+            raise
+
+        if self.get_connection(connection_host, connection_port) is not None:
+            writer.close()
+            return True
+
+        connection = AsyncP2PConnection(self, reader, writer, host, port, connection_host, connection_port, framing)
+        self.connections.append(connection)
+
+        self.dispatch(P2PEvents.CONNECTED, (host, port))
+        task = self.loop.create_task(connection.run())
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+        return True
+
+    async def accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            (connection_host, connection_port, framing) = P2PNode.from_handshake(await AsyncP2PNode.read_handshake(reader))
+
+            writer.write(P2PNode.to_handshake(self.host, self.port, framing))
+            await writer.drain()
+
+        except Exception as e:
+            print('could not accept', e)
+            writer.close()
+            return
+
+        client_addr = writer.get_extra_info('peername')
+
+        connection = AsyncP2PConnection(self, reader, writer, client_addr[0], client_addr[1], connection_host, connection_port, framing)
+        self.connections.append(connection)
+
+        self.dispatch(P2PEvents.CONNECTED, (connection_host, connection_port))
+
+        task = asyncio.current_task()
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+        await connection.run()
+
+    @staticmethod
+    async def read_handshake(reader: asyncio.StreamReader) -> str:
+        return (await reader.readuntil(END_OF_MESSAGE))[:-1].decode(MESSAGE_ENCODING)
+
+    def disconnect(self, host, port):
+        # The connection reports DISCONNECTED itself once its stream is closed
+        for connection in list(self.connections):
+            if connection.host == host and connection.port == port:
+                connection.stop()
+
+    def stop(self):
+        self.terminate_flag.set()
+
+        if self.loop is not None and self.stopped is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def serve(self):
+        self.stopped = asyncio.Event()
+
+        print("Initialisation of the Node on port: " + str(self.port))
+        server = await asyncio.start_server(self.accept, self.host, self.port, limit=MAX_MESSAGE_SIZE, reuse_address=True)
+
+        self.started.set()
+        self.dispatch(P2PEvents.STARTED, None)
+
+        if self.terminate_flag.is_set():
+            self.stopped.set()
+
+        await self.stopped.wait()
+
+        server.close()
+
+        for connection in list(self.connections):
+            connection.writer.transport.abort()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await server.wait_closed()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+
+        try:
+            self.loop.run_until_complete(self.serve())
+
+        finally:
+            self.started.set()
+            self.loop.close()
+
+        self.dispatch(P2PEvents.SHUTDOWN, None)
+        self.callback_executor.shutdown(wait=True)
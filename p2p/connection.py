@@ -4,11 +4,19 @@ import threading
 import json
 import typing
 
-from p2p.constants import MESSAGE_ENCODING, END_OF_MESSAGE, BUFFER_SIZE
+from p2p.constants import MESSAGE_ENCODING, END_OF_MESSAGE, BUFFER_SIZE, BINARY_MESSAGE_MARKER
+from p2p.framing import FRAME_HEADER, FRAMING_DELIMITED, FRAMING_LENGTH, FrameBuffer
 from p2p.events import P2PEvents
+from p2p.send_queue import SendQueue
 
 class P2PConnection(threading.Thread):
-    def __init__(self, sock: socket.socket, host: str, port: int, callback: typing.Callable[[P2PEvents, typing.Any], None] = None, original_host: str = None, original_port: int = None) -> None:
+    """
+    P2P Connection
+     - Reads messages from the peer on this thread
+     - Messages sent to the peer go through its send queue, and are written to the socket by a separate writer thread,
+       so a slow peer never holds up the thread that sends to it
+    """
+    def __init__(self, sock: socket.socket, host: str, port: int, callback: typing.Callable[..., None] = None, original_host: str = None, original_port: int = None, framing: str = FRAMING_DELIMITED, received: bytes = b'') -> None:
         super(P2PConnection, self).__init__()
 
         self.host = host
@@ -19,45 +27,123 @@ class P2PConnection(threading.Thread):
 
         self.sock = sock
 
+        # Framing negotiated in the handshake, see p2p/framing.py
+        self.framing = framing
+
+        # Bytes the peer sent right after the handshake, read along with it
+        self.received = received
+
         self.terminate_flag = threading.Event()
 
         self.callback = callback
 
+        self.send_queue = SendQueue()
+        self.send_event = threading.Event()
+        self.writer = threading.Thread(target=self.write_queued, daemon=True)
+
         self.sock.settimeout(10.0)
 
-    def send(self, data):
-        if isinstance(data, str):
+    def send(self, data, key: str = None):
+        if self.terminate_flag.is_set():
+            return
+
+        message = P2PConnection.encode_message(data, self.framing)
+
+        if message is None:
+            return
+
+        if not self.send_queue.put(message, key):
+            print('send queue full, disconnecting', self.host, self.port)
+            self.stop()
+
+            # Unblocks the writer, which is most likely stuck sending to the peer
             try:
-                self.sock.sendall(data.encode(MESSAGE_ENCODING) + END_OF_MESSAGE)
+                self.sock.shutdown(socket.SHUT_RDWR)
+
+            except OSError:
+                pass
+
+            return
+
+        self.send_event.set()
+
+    def write_queued(self):
+        while not self.terminate_flag.is_set():
+            # Cleared before looking at the queue, so a message queued in between still wakes the writer
+            self.send_event.clear()
+            queued = self.send_queue.get()
+
+            if queued is None:
+                self.send_event.wait(1)
+                continue
+
+            (message, enqueued_at) = queued
+
+            try:
+                self.sock.sendall(message)
+                self.send_queue.record_sent(enqueued_at)
+
             except Exception as e:
                 print(e)
                 self.stop()
-        
+
+    @staticmethod
+    def encode_message(data, framing: str = FRAMING_DELIMITED) -> typing.Union[bytes, None]:
+        payload = P2PConnection.encode_payload(data)
+
+        if payload is None:
+            return None
+
+        if framing == FRAMING_LENGTH:
+            return FRAME_HEADER.pack(len(payload)) + payload
+
+        return payload + END_OF_MESSAGE
+
+    @staticmethod
+    def to_json(data):
+        # Objects that are not JSON types are sent through their own to_json
+        if hasattr(data, 'to_json'):
+            return data.to_json()
+
+        raise TypeError(f'Object of type {type(data).__name__} is not JSON serializable')
+
+    @staticmethod
+    def encode_payload(data) -> typing.Union[bytes, None]:
+        if isinstance(data, str):
+            return data.encode(MESSAGE_ENCODING)
+
         elif isinstance(data, dict):
             try:
-                json_data = json.dumps(data)
-                json_data = json_data.encode(MESSAGE_ENCODING) + END_OF_MESSAGE
-                self.sock.sendall(json_data)
-                
+                return json.dumps(data, default=P2PConnection.to_json).encode(MESSAGE_ENCODING)
+
             except TypeError as type_error:
                 print('Error:', type_error)
-            
-            except Exception as e:
-                self.stop()
-        
+                return None
+
         elif isinstance(data, bytes):
-            self.sock.sendall(data + END_OF_MESSAGE)
-        
+            return data
+
         else:
             print('not valid')
+            return None
 
-    
     def stop(self):
         self.terminate_flag.set()
+        self.send_event.set()
+
+    @property
+    def closed(self) -> bool:
+        # The node keeps stopped connections in its list, so senders check this to pass them over
+        return self.terminate_flag.is_set()
 
-    def parse_packet(self, packet):
+    @staticmethod
+    def parse_packet(packet):
+        if packet[:1] == BINARY_MESSAGE_MARKER:
+            return bytes(packet)
+
+        # Decoding straight from the buffer also accepts a memoryview without copying it first
         try:
-            decoded = packet.decode(MESSAGE_ENCODING)
+            decoded = str(packet, MESSAGE_ENCODING)
 
             try:
                 return json.loads(decoded)
@@ -66,10 +152,43 @@ class P2PConnection(threading.Thread):
                 return decoded
 
         except UnicodeDecodeError:
-            return packet
+            return bytes(packet)
     
     def run(self):
-        buffer = b''
+        self.writer.start()
+
+        if self.framing == FRAMING_LENGTH:
+            self.run_length_framed()
+        else:
+            self.run_delimited()
+
+        self.stop()
+        self.writer.join()
+
+        self.sock.settimeout(None)
+        self.sock.close()
+
+    def run_length_framed(self):
+        frame_buffer = FrameBuffer()
+        frame_buffer.feed(self.received)
+
+        while not self.terminate_flag.is_set():
+            try:
+                for packet in frame_buffer.frames():
+                    if self.callback is not None:
+                        self.callback(P2PEvents.MESSAGE_RECEIVED, self.parse_packet(packet), self)
+
+                if frame_buffer.recv_into(self.sock) == 0:
+                    self.terminate_flag.set()
+
+            except socket.timeout:
+                pass
+
+            except Exception:
+                self.terminate_flag.set()
+
+    def run_delimited(self):
+        buffer = self.parse_delimited(self.received)
 
         while not self.terminate_flag.is_set():
             chunk = b''
@@ -84,19 +203,21 @@ class P2PConnection(threading.Thread):
                 self.terminate_flag.set()
 
             if chunk != b'':
-                buffer += chunk
-                message_end = buffer.find(END_OF_MESSAGE)
+                buffer = self.parse_delimited(buffer + chunk)
+                
+            time.sleep(0.01)
 
-                while message_end > 0:
-                    packet  = buffer[:message_end]
-                    buffer = buffer[message_end + 1:]
+    def parse_delimited(self, buffer: bytes) -> bytes:
+        # Hands the complete messages in buffer to the callback, and returns the rest
+        message_end = buffer.find(END_OF_MESSAGE)
 
-                    if self.callback is not None:
-                        self.callback(P2PEvents.MESSAGE_RECEIVED, self.parse_packet(packet))
+        while message_end > 0:
+            packet  = buffer[:message_end]
+            buffer = buffer[message_end + 1:]
 
-                    message_end = buffer.find(END_OF_MESSAGE)
-                
-            time.sleep(0.01)
+            if self.callback is not None:
+                self.callback(P2PEvents.MESSAGE_RECEIVED, self.parse_packet(packet), self)
 
-        self.sock.settimeout(None)
-        self.sock.close()   
\ No newline at end of file
+            message_end = buffer.find(END_OF_MESSAGE)
+
+        return buffer
@@ -1,3 +1,14 @@
 END_OF_MESSAGE = 0x04.to_bytes(1, 'big')
 MESSAGE_ENCODING = 'utf-8'
-BUFFER_SIZE = 4096
\ No newline at end of file
+BUFFER_SIZE = 4096
+
+# Largest message the asyncio transport buffers while looking for the end of a message
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Payloads starting with this byte are binary (see blockchain/codec.py) and are handed over as bytes
+BINARY_MESSAGE_MARKER = b'\x00'
+
+# Messages waiting to be written to one peer before its send queue is full, and what happens to the ones sent after that:
+# 'drop' drops them, 'disconnect' disconnects the peer
+SEND_QUEUE_SIZE = 1000
+SEND_QUEUE_POLICY = 'drop'
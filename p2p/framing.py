@@ -0,0 +1,93 @@
+import struct
+import socket
+import typing
+
+from p2p.constants import BUFFER_SIZE, MAX_MESSAGE_SIZE
+
+"""
+Message Framing
+ - delimited: every message ends with END_OF_MESSAGE, the original format
+ - length: every message is prefixed with its length as a 4 byte big endian integer, so payloads may contain any byte
+ - Nodes offer length framing in the connect/accept handshake and fall back to delimited framing if the peer does not;
+   a framing neither of these is refused
+"""
+
+FRAMING_DELIMITED = 'delimited'
+FRAMING_LENGTH = 'length'
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+class FrameTooLarge(Exception):
+    pass
+
+
+class FrameBuffer():
+    """
+    Receive buffer for length prefixed frames
+     - One bytearray is reused for the whole connection and filled with recv_into, so data is not copied on receive
+     - Frames are handed out as memoryviews into the buffer, valid until the next call to recv_into
+     - The buffer only grows when a frame does not fit, so parsing is linear in the size of the data received
+    """
+    def __init__(self, size: int = BUFFER_SIZE * 16) -> None:
+        self.buffer = bytearray(size)
+
+        # Received but not yet parsed data lies in buffer[start:end]
+        self.start = 0
+        self.end = 0
+
+    def recv_into(self, sock: socket.socket) -> int:
+        self.make_room()
+
+        with memoryview(self.buffer) as view:
+            received = sock.recv_into(view[self.end:])
+
+        self.end += received
+        return received
+
+    def feed(self, data: bytes) -> None:
+        # Data that was received by other means, such as along with the handshake
+        if len(self.buffer) - self.end < len(data):
+            self.buffer.extend(bytes(len(data) - (len(self.buffer) - self.end)))
+
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def make_room(self) -> None:
+        pending = self.end - self.start
+        needed = BUFFER_SIZE
+
+        if pending >= FRAME_HEADER.size:
+            needed = max(needed, FRAME_HEADER.size + FRAME_HEADER.unpack_from(self.buffer, self.start)[0] - pending)
+
+        if len(self.buffer) - self.end >= needed:
+            return
+
+        # Move the partial frame to the front, and grow the buffer if the frame still does not fit
+        self.buffer[0:pending] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+        if len(self.buffer) - self.end < needed:
+            self.buffer.extend(bytes(max(len(self.buffer), needed - (len(self.buffer) - self.end))))
+
+    def frames(self) -> typing.Iterator[memoryview]:
+        while self.end - self.start >= FRAME_HEADER.size:
+            length = FRAME_HEADER.unpack_from(self.buffer, self.start)[0]
+
+            if length > MAX_MESSAGE_SIZE:
+                raise FrameTooLarge(length)
+
+            if self.end - self.start - FRAME_HEADER.size < length:
+                return
+
+            frame_start = self.start + FRAME_HEADER.size
+            self.start = frame_start + length
+
+            with memoryview(self.buffer) as view:
+                frame = view[frame_start:frame_start + length]
+                yield frame
+                frame.release()
+
+        if self.start == self.end:
+            self.start = self.end = 0
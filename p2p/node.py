@@ -4,8 +4,9 @@ import threading
 import typing
 
 from p2p.connection import P2PConnection
-from p2p.constants import MESSAGE_ENCODING, BUFFER_SIZE
+from p2p.constants import MESSAGE_ENCODING, BUFFER_SIZE, END_OF_MESSAGE
 from p2p.events import P2PEvents
+from p2p.framing import FRAMING_DELIMITED, FRAMING_LENGTH
 
 class P2PNode(threading.Thread):
     def __init__(self) -> None:
@@ -26,7 +27,7 @@ class P2PNode(threading.Thread):
 
         self.event_handler = self.handler
 
-    def init(self, host: str, port: int, callback: typing.Callable[[P2PEvents, typing.Any], None] = None) -> None:
+    def init(self, host: str, port: int, callback: typing.Callable[..., None] = None) -> None:
         self.host = host
         self.port = port
 
@@ -48,8 +49,9 @@ class P2PNode(threading.Thread):
         for connection in self.connections:
             self.send_to_node(connection, data)
     
-    def send_to_node(self, connection, data):
-        connection.send(data)
+    def send_to_node(self, connection, data, key: str = None):
+        # Messages sent with the same key replace each other while they wait in the connection's send queue
+        connection.send(data, key)
     
     def get_connection(self, host: str, port: int):
         for connection in self.connections:
@@ -58,7 +60,7 @@ class P2PNode(threading.Thread):
         
         return None
 
-    def handler(self, event, data):
+    def handler(self, event, data, connection = None):
         print(event, data)
 
     def connect(self, host: str, port: int) -> bool:
@@ -77,14 +79,17 @@ class P2PNode(threading.Thread):
             sock.settimeout(None)
             sock.connect((host, port))
 
-            sock.send(P2PNode.to_url(self.host, self.port).encode(MESSAGE_ENCODING))
-            (connection_host, connection_port) = P2PNode.from_url(sock.recv(BUFFER_SIZE).decode(MESSAGE_ENCODING))
+            # Length framing is offered, and used if the peer accepts it in its reply
+            sock.sendall(P2PNode.to_handshake(self.host, self.port, FRAMING_LENGTH))
+
+            (handshake, received) = P2PNode.receive_handshake(sock)
+            (connection_host, connection_port, framing) = P2PNode.from_handshake(handshake)
             
             for connection in self.connections:
                 if (connection_host == connection.host and connection_port == connection.port) or (connection_host == connection.original_host and connection_port == connection.original_port):
                     return True
 
-            thread_client = self.create_new_connection(sock, host, port, connection_host, connection_port)
+            thread_client = self.create_new_connection(sock, host, port, connection_host, connection_port, framing, received)
             thread_client.start()
 
             self.connections.append(thread_client)
@@ -105,8 +110,8 @@ class P2PNode(threading.Thread):
     def stop(self):
         self.terminate_flag.set()
     
-    def create_new_connection(self, sock, host, port, original_host = None, original_port = None):
-        return P2PConnection(sock, host, port, self.event_handler, original_host, original_port)
+    def create_new_connection(self, sock, host, port, original_host = None, original_port = None, framing = FRAMING_DELIMITED, received = b''):
+        return P2PConnection(sock, host, port, self.event_handler, original_host, original_port, framing, received)
     
     def run(self):
         self.event_handler(P2PEvents.STARTED, None)
@@ -116,10 +121,21 @@ class P2PNode(threading.Thread):
                 try:
                     connection, client_addr = self.sock.accept()
 
-                    (connection_host, connection_port) = P2PNode.from_url(connection.recv(BUFFER_SIZE).decode(MESSAGE_ENCODING))
-                    connection.send(P2PNode.to_url(self.host, self.port).encode(MESSAGE_ENCODING))
+                    try:
+                        # A peer that does not complete the handshake does not hold up the next one for long
+                        connection.settimeout(10.0)
+
+                        (handshake, received) = P2PNode.receive_handshake(connection)
+                        (connection_host, connection_port, framing) = P2PNode.from_handshake(handshake)
+
+                        connection.sendall(P2PNode.to_handshake(self.host, self.port, framing))
 
-                    thread_client = self.create_new_connection(connection, client_addr[0], client_addr[1], connection_host, connection_port)
+                    except (OSError, ValueError) as e:
+                        print('could not accept', e)
+                        connection.close()
+                        continue
+
+                    thread_client = self.create_new_connection(connection, client_addr[0], client_addr[1], connection_host, connection_port, framing, received)
                     thread_client.start()
 
                     self.connections.append(thread_client)
@@ -151,6 +167,10 @@ class P2PNode(threading.Thread):
 
         self.event_handler(P2PEvents.SHUTDOWN, None)
 
+    def connection_stats(self) -> typing.List[dict]:
+        # Send queue depth and latency of every peer
+        return [{'url': P2PNode.to_url(connection.original_host, connection.original_port), **connection.send_queue.stats()} for connection in list(self.connections)]
+
     @property
     def connection_urls(self):
         return list(map(lambda x: P2PNode.to_url(x.original_host, x.original_port), self.connections))
@@ -162,4 +182,51 @@ class P2PNode(threading.Thread):
     @staticmethod
     def from_url(url: str):
         split = url.split(':')
-        return split[0], int(split[1])
\ No newline at end of file
+        return split[0], int(split[1])
+
+    """
+        Handshake
+        - Both sides of a new connection send their url, followed by the options they want for it, and END_OF_MESSAGE
+        - framing=length asks for length prefixed framing; a peer that does not send it back gets END_OF_MESSAGE delimited framing
+        - A framing the node does not know is an error, rather than taken for delimited framing
+        - The first message may arrive along with the handshake, so the bytes read after END_OF_MESSAGE belong to the connection
+    """
+    @staticmethod
+    def to_handshake(host: str, port: int, framing: str) -> bytes:
+        return (P2PNode.to_url(host, port) + ';framing=' + framing).encode(MESSAGE_ENCODING) + END_OF_MESSAGE
+
+    @staticmethod
+    def from_handshake(handshake: str):
+        (url, _, options) = handshake.partition(';')
+        (host, port) = P2PNode.from_url(url)
+
+        framing = FRAMING_DELIMITED
+
+        for option in options.split(';'):
+            if option.startswith('framing='):
+                framing = option[len('framing='):]
+
+        if framing not in (FRAMING_DELIMITED, FRAMING_LENGTH):
+            raise ValueError('Unknown framing ' + framing)
+
+        return host, port, framing
+
+    @staticmethod
+    def receive_handshake(sock: socket.socket) -> typing.Tuple[str, bytes]:
+        # Returns the handshake and the bytes the peer sent after it
+        received = b''
+
+        while END_OF_MESSAGE not in received:
+            if len(received) > BUFFER_SIZE:
+                raise ValueError('Handshake too long')
+
+            chunk = sock.recv(BUFFER_SIZE)
+
+            if chunk == b'':
+                raise ConnectionError('Connection closed during the handshake')
+
+            received += chunk
+
+        (handshake, _, rest) = received.partition(END_OF_MESSAGE)
+
+        return handshake.decode(MESSAGE_ENCODING), rest
@@ -0,0 +1,98 @@
+import collections
+import threading
+import time
+import typing
+
+from p2p.constants import SEND_QUEUE_POLICY, SEND_QUEUE_SIZE
+
+SEND_QUEUE_DROP = 'drop'
+SEND_QUEUE_DISCONNECT = 'disconnect'
+
+
+class SendQueue():
+    """
+    Outbound Send Queue
+     - Bounded queue of the encoded messages waiting to be written to one peer, drained by the connection's own writer,
+       so sending never blocks on a slow peer
+     - A message sent with a key replaces the message with the same key that is still waiting, instead of queueing behind it
+     - Once max_size messages are waiting, new ones are dropped (drop) or the peer is disconnected (disconnect)
+     - Keeps the queue depth and how long messages waited until they were written, for the /stats endpoint
+    """
+    def __init__(self, max_size: int = SEND_QUEUE_SIZE, policy: str = SEND_QUEUE_POLICY) -> None:
+        self.max_size = max_size
+        self.policy = policy
+
+        # Waiting messages as [message, enqueue time, key], with the ones sent with a key also indexed by it
+        self.messages: typing.Deque[list] = collections.deque()
+        self.keys: typing.Dict[str, list] = {}
+
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    def put(self, message: bytes, key: str = None) -> bool:
+        """
+        Queue a message, returning False if the queue is full and the policy is to disconnect the peer
+        """
+        with self.lock:
+            if key is not None and key in self.keys:
+                self.keys[key][0] = message
+                self.coalesced += 1
+                return True
+
+            if len(self.messages) >= self.max_size:
+                self.dropped += 1
+                return self.policy != SEND_QUEUE_DISCONNECT
+
+            entry = [message, time.perf_counter(), key]
+            self.messages.append(entry)
+
+            if key is not None:
+                self.keys[key] = entry
+
+            self.max_depth = max(self.max_depth, len(self.messages))
+
+            return True
+
+    def get(self) -> typing.Union[typing.Tuple[bytes, float], None]:
+        with self.lock:
+            if len(self.messages) == 0:
+                return None
+
+            (message, enqueued_at, key) = self.messages.popleft()
+
+            if key is not None:
+                del self.keys[key]
+
+            return message, enqueued_at
+
+    def record_sent(self, enqueued_at: float) -> None:
+        latency = time.perf_counter() - enqueued_at
+
+        with self.lock:
+            self.sent += 1
+            self.latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'depth': len(self.messages),
+                'max_depth': self.max_depth,
+                'max_size': self.max_size,
+                'policy': self.policy,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'average_latency_seconds': self.latency_seconds / self.sent if self.sent > 0 else 0,
+                'max_latency_seconds': self.max_latency_seconds
+            }
+
+    def __len__(self) -> int:
+        return len(self.messages)
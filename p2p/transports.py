@@ -0,0 +1,16 @@
+from p2p.async_node import AsyncP2PNode
+from p2p.node import P2PNode
+
+"""
+P2P Transports
+ - The P2P node classes by the name they are picked with on the command line, shared by main.py and the benchmarks
+ - threaded: a thread per peer connection; asyncio: all peer connections on a single asyncio event loop
+"""
+
+TRANSPORT_THREADED = 'threaded'
+TRANSPORT_ASYNCIO = 'asyncio'
+
+TRANSPORTS = {
+    TRANSPORT_THREADED: P2PNode,
+    TRANSPORT_ASYNCIO: AsyncP2PNode,
+}
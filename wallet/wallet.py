@@ -1,32 +1,46 @@
 import typing
-from functools import reduce
 
 from ellipticcurve.ecdsa import Ecdsa
 from ellipticcurve.privateKey import PrivateKey
-from ellipticcurve.signature import Signature
 
-from blockchain.transaction import Transaction, TransactionIn, TransactionOut, TransactionTypes, UnspentTransactionOut
-from blockchain.constants import CHAIN_ADDRESS
+from blockchain.transaction import Transaction, TransactionIn, TransactionOut, TransactionTypes, UnspentTransactionOut, UnspentTransactionOutSet
+from blockchain.accounts import AccountIndex
+from blockchain.mempool import Mempool
+from blockchain.verification import signature_cache
 
 class Wallet():
     def __init__(self) -> None:
         # Create Private Keys and Public Key from Private key
-        self.private_key = PrivateKey()
-        self.public_key = self.private_key.publicKey()
+        self.set_keys(PrivateKey())
 
     def load_keys_from_file(self, filename: str) -> None:
         # If the node is owner, private key is loaded from wallet.key file
         # Public Key is created from private key loaded from wallet.key file
-        self.private_key = PrivateKey.fromString(open(filename).readlines()[0])
-        self.public_key = self.private_key.publicKey()
+        self.set_keys(PrivateKey.fromString(open(filename).readlines()[0]))
 
     def set_private_key(self, private_key: str) -> None:
-        self.private_key = PrivateKey.fromString(private_key)
-        self.public_key - self.private_key.publicKey()
+        self.set_keys(PrivateKey.fromString(private_key))
+
+    def set_keys(self, private_key: PrivateKey) -> None:
+        # Deriving the public key is a curve multiplication, so it and the address are computed once per key
+        self.private_key = private_key
+        self.public_key = self.private_key.publicKey()
+        self.address = self.public_key.toString()
+
+    def create_transaction(self, recipient_address: str, amount: float, unspent_transaction_outs: UnspentTransactionOutSet, transaction_pool: Mempool, type: TransactionTypes = TransactionTypes.TRANSFER) -> typing.Union[Transaction, None]:
+        return self.create_batch_transaction([(recipient_address, amount)], unspent_transaction_outs, transaction_pool, type)
+
+    def create_batch_transaction(self, payments: typing.List[typing.Tuple[str, float]], unspent_transaction_outs: UnspentTransactionOutSet, transaction_pool: Mempool, type: TransactionTypes = TransactionTypes.TRANSFER) -> typing.Union[Transaction, None]:
+        """
+        Create one transaction paying every (recipient_address, amount) of payments
+         - Coins are selected once for the total amount, and the change goes back to the wallet in a single transaction out
+         - Each input is signed once, however many recipients there are
+         - Only the wallet's own unspent transaction outs are looked at, through the per address index of the UTXO set, and the
+           ones already spent by a pooled transaction are skipped through the spent index of the mempool
+        """
+        amount = sum(payment_amount for (_, payment_amount) in payments)
 
-    def create_transaction(self, recipient_address: str, amount: float, unspent_transaction_outs: typing.List[UnspentTransactionOut], transaction_pool: typing.List[Transaction], type: TransactionTypes = TransactionTypes.TRANSFER) -> typing.Union[Transaction, None]:
-        my_address = self.public_key.toString()
-        my_unspent_transactions = self.filter_transaction_pool([u for u in unspent_transaction_outs if u.address == my_address], transaction_pool)
+        my_unspent_transactions = self.filter_transaction_pool(unspent_transaction_outs.get_unspent_transaction_outs(self.address), transaction_pool)
 
         ret = self.transaction_outs_for_amount(my_unspent_transactions, amount)
         if ret is not None:
@@ -35,7 +49,7 @@ class Wallet():
             return None
 
         unsigned_transaction_ins = [TransactionIn(unspent_transaction_out.transaction_out_id, unspent_transaction_out.transaction_out_index, '') for unspent_transaction_out in included_unspent_transaction_outs]
-        transaction_outs = self.create_transaction_outs(recipient_address, amount, left_over_amount)
+        transaction_outs = self.create_transaction_outs(payments, left_over_amount)
 
         transaction = Transaction(unsigned_transaction_ins, transaction_outs, type)
 
@@ -44,61 +58,90 @@ class Wallet():
         if transaction_signatures is None:
             return None
 
-        for i, transaction_in in enumerate(transaction.transaction_ins):
-            transaction.transaction_ins[i] = TransactionIn(transaction_in.transaction_out_id, transaction_in.transaction_out_index, transaction_signatures[i])
+        transaction.transaction_ins = [TransactionIn(transaction_in.transaction_out_id, transaction_in.transaction_out_index, transaction_signatures[i]) for i, transaction_in in enumerate(transaction.transaction_ins)]
 
         return transaction
 
-    def filter_transaction_pool(self, unspent_transasction_outs: typing.List[UnspentTransactionOut], transaction_pool: typing.List[Transaction]) -> typing.List[UnspentTransactionOut]:
-        transaction_ins = [transaction_in for transaction in transaction_pool for transaction_in in transaction.transaction_ins]
-        removable: typing.List[UnspentTransactionOut] = []
-
-        for unspent_transaction_out in unspent_transasction_outs:
-            current_ins = [transaction_in for transaction_in in transaction_ins if transaction_in.transaction_out_index == unspent_transaction_out.transaction_out_index and transaction_in.transaction_out_id == unspent_transaction_out.transaction_out_id]
-            if len(current_ins) != 0:
-                removable.append(unspent_transaction_out)
-
-        return [unspent_transaction_out for unspent_transaction_out in unspent_transasction_outs if unspent_transaction_out not in removable]
+    def filter_transaction_pool(self, unspent_transasction_outs: typing.List[UnspentTransactionOut], transaction_pool: Mempool) -> typing.List[UnspentTransactionOut]:
+        # Transaction outs already spent by a pooled transaction cannot be spent again
+        return [unspent_transaction_out for unspent_transaction_out in unspent_transasction_outs if not transaction_pool.is_spent(unspent_transaction_out.transaction_out_id, unspent_transaction_out.transaction_out_index)]
 
 
+    """
+        Transaction outs for amount
+        - Coin selection: every input costs a signature to create and to verify, so as few transaction outs as possible are spent
+        - Taking the largest transaction outs first reaches the amount with the fewest of them
+        - The last one taken is swapped for the smallest transaction out that still covers what is left, which keeps the change
+          small and leaves the large transaction outs for later payments; a transaction out matching the amount exactly needs no change
+    """
     def transaction_outs_for_amount(self, unspent_transaction_outs: typing.List[UnspentTransactionOut], amount: float) -> typing.Union[typing.Tuple[typing.List[UnspentTransactionOut], float], None]:
+        candidates = sorted(unspent_transaction_outs, key=lambda u: u.amount, reverse=True)
+
         current_amount = 0
-        included_unspent_transaction_outs: typing.List[UnspentTransactionOut] = []
+        included_count = 0
+
+        for unspent_transaction_out in candidates:
+            if current_amount + unspent_transaction_out.amount >= amount:
+                break
 
-        for unspent_transaction_out in unspent_transaction_outs:
-            included_unspent_transaction_outs.append(unspent_transaction_out)
             current_amount += unspent_transaction_out.amount
+            included_count += 1
+        else:
+            return None
+
+        # Candidates are sorted largest first, so the last one covering the rest is the smallest that does
+        remaining_amount = amount - current_amount
+        last_unspent_transaction_out = candidates[included_count]
+
+        for unspent_transaction_out in candidates[included_count + 1:]:
+            if unspent_transaction_out.amount < remaining_amount:
+                break
+
+            last_unspent_transaction_out = unspent_transaction_out
+
+        included_unspent_transaction_outs = candidates[:included_count] + [last_unspent_transaction_out]
 
-            if current_amount >= amount:
-                return (included_unspent_transaction_outs, current_amount - amount)
-        return None
+        return (included_unspent_transaction_outs, current_amount + last_unspent_transaction_out.amount - amount)
 
 
-    def create_transaction_outs(self, recipient_address: str, amount: float, left_over_amount: float) -> typing.List[TransactionOut]:
-        transaction_out = TransactionOut(recipient_address, amount)
+    def create_transaction_outs(self, payments: typing.List[typing.Tuple[str, float]], left_over_amount: float) -> typing.List[TransactionOut]:
+        transaction_outs = [TransactionOut(recipient_address, amount) for (recipient_address, amount) in payments]
 
         if left_over_amount == 0:
-            return [transaction_out]
+            return transaction_outs
         else:
-            left_over_transaction = TransactionOut(self.public_key.toString(), left_over_amount)
-            return [transaction_out, left_over_transaction]
+            left_over_transaction = TransactionOut(self.address, left_over_amount)
+            return transaction_outs + [left_over_transaction]
 
 
-    def get_transaction_signatures(self, transaction: Transaction, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> typing.Union[typing.List[str], None]:
+    """
+        Get Transaction Signatures
+        - Every input signs the same message, the transaction id, and the signer picks its nonce deterministically (RFC 6979)
+          from the message and the key, so every input gets the same signature
+        - The transaction is therefore hashed and signed once, and the signature is used for all of its inputs
+    """
+    def get_transaction_signatures(self, transaction: Transaction, unspent_transaction_outs: UnspentTransactionOutSet) -> typing.Union[typing.List[str], None]:
         signatures: typing.List[str] = []
+        signature = None
 
-        for i in range(len(transaction.transaction_ins)):
-            transaction_in = transaction.transaction_ins[i]
+        transaction_id = transaction.id
 
+        for transaction_in in transaction.transaction_ins:
             referenced_unspent_transaction_out = UnspentTransactionOut.find_unspent_transaction_out(transaction_in.transaction_out_id, transaction_in.transaction_out_index, unspent_transaction_outs)
 
             if referenced_unspent_transaction_out is None:
                 return None
 
-            if self.private_key.publicKey().toString() != referenced_unspent_transaction_out.address:
+            if self.address != referenced_unspent_transaction_out.address:
                 return None
 
-            signatures.append(Ecdsa.sign(transaction.id, self.private_key)._toString())
+            if signature is None:
+                signature = Ecdsa.sign(transaction_id, self.private_key)._toString()
+
+            signatures.append(signature)
+
+            # Our own signatures are known to be valid, so the node never has to verify them
+            signature_cache.add((transaction_id, signature, referenced_unspent_transaction_out.address, referenced_unspent_transaction_out.key))
 
         return signatures
 
@@ -107,41 +150,23 @@ class Wallet():
         Can account Validate
         - If there is a transaction which has the type 'VALIDATOR', that shows that
           the node has undergone a transaction for it to become a validator
-        - Hence, we are checking for a VALIDATOR TransactionType and returning True if it is existing
+        - The account index of the chain tracks these transactions per address
     """
-    def can_account_validate(self, transactions: typing.List[Transaction]) -> bool:
-        for transaction in transactions:
-            if transaction.type == TransactionTypes.VALIDATOR and Ecdsa.verify(transaction.id, Signature._fromString(transaction.transaction_ins[0].signature), self.public_key):
-                return True
-
-        return False
+    def can_account_validate(self, accounts: AccountIndex) -> bool:
+        return accounts.is_validator(self.address)
 
 
     """
         Get Account Balance
-        - User’s balance is calculated by scanning the blockchain and aggregating all UTXO belonging to that user/node.
+        - User’s balance is the sum of all UTXO belonging to that user/node, which the UTXO set keeps per address
     """
-    def get_account_balance(self, unspent_transaction_outs: typing.List[UnspentTransactionOut]) -> float:
-        return reduce(
-          lambda a,b: a + b.amount,
-          [unspent_transaction_out
-          for unspent_transaction_out in unspent_transaction_outs
-            if unspent_transaction_out.address == self.public_key.toString()
-          ], 0)
+    def get_account_balance(self, unspent_transaction_outs: UnspentTransactionOutSet) -> float:
+        return unspent_transaction_outs.get_balance(self.address)
 
     """
         Get Account Stake Balance
         - Amount of coins staked are calculated
+        - The account index of the chain adds up the coins sent to CHAIN_ADDRESS by STAKE transactions per address
     """
-    def get_account_stake(self, transactions: typing.List[Transaction]) -> float:
-        stake_amount = 0
-
-        # If transaction type is STAKE, it is considered as a STAKE transaction
-        # We calculate the transaction_outs and if the transaction_out.address == CHAIN_ADDRESS, the transaction_out.amount is added to stake_amount
-        for transaction in transactions:
-            if transaction.type == TransactionTypes.STAKE and Ecdsa.verify(transaction.id, Signature._fromString(transaction.transaction_ins[0].signature), self.public_key):
-                for transaction_out in transaction.transaction_outs:
-                    if transaction_out.address == CHAIN_ADDRESS:
-                        stake_amount += transaction_out.amount
-
-        return stake_amount
\ No newline at end of file
+    def get_account_stake(self, accounts: AccountIndex) -> float:
+        return accounts.get_stake(self.address)
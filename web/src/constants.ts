@@ -1,2 +1,5 @@
 export const SERVER_URL =
 	process.env.NODE_ENV === 'development' ? 'http://localhost:4000' : '';
+
+// Number of blocks and transactions fetched per page
+export const PAGE_SIZE = 20;
@@ -0,0 +1,18 @@
+import { SERVER_URL } from '../constants';
+
+let source: EventSource | null = null;
+
+// A single EventSource to /events is shared by every component listening to live updates
+export const onServerEvent = (
+	event: string,
+	handler: (data: any) => void
+): (() => void) => {
+	if (source === null) {
+		source = new EventSource(`${SERVER_URL}/events`);
+	}
+
+	const listener = (e: MessageEvent) => handler(JSON.parse(e.data));
+	source.addEventListener(event, listener);
+
+	return () => source?.removeEventListener(event, listener);
+};
@@ -14,6 +14,14 @@ export type Chain = {
 	minter_balance: number;
 	timestamp: string | number | Date;
 	transactions: any;
+	hash?: string;
+	transaction_count?: number;
+};
+
+export type BlockPage = {
+	blocks: Chain[];
+	length: number;
+	next: number | null;
 };
 
 export type TransactionIn = {
@@ -33,3 +41,9 @@ export type TransactionPool = {
 	transaction_outs: TransactionOut[];
 	type: string;
 };
+
+export type TransactionPage = {
+	transactions: TransactionPool[];
+	length: number;
+	next: number | null;
+};